@@ -0,0 +1,73 @@
+import os
+import cv2
+import numpy as np
+from pipeline.models import registry
+from pipeline import backends
+
+modelDir=os.path.dirname(os.path.abspath(__file__))
+
+faceProto=os.path.join(modelDir, "Face_Detection/opencv_face_detector.pbtxt")
+faceModel=os.path.join(modelDir, "Face_Detection/opencv_face_detector_uint8.pb")
+
+# варианты той же SSD: uint8 (TensorFlow, по умолчанию) и fp16 (Caffe res10),
+# файлы fp16 кладутся в Face_Detection рядом с uint8.
+# (модель, конфиг, swapRB): модель Caffe ждет BGR, перестановка каналов ей не нужна
+faceModels={
+    'uint8': (faceModel, faceProto, True),
+    'fp16': (os.path.join(modelDir, "Face_Detection/res10_300x300_ssd_iter_140000_fp16.caffemodel"),
+             os.path.join(modelDir, "Face_Detection/deploy.prototxt"), False),
+}
+
+
+def loadFaceNet(variant='uint8'):
+    model,config,_=faceModels[variant]
+    return backends.apply(cv2.dnn.readNet(model,config), 'face_ssd')
+
+
+def warmupFaceNet(net):
+    net.setInput(np.zeros((1, 3, 300, 300), np.float32))
+    net.forward()
+
+
+class FaceDetector(object):
+    # один проход SSD на кадр: кадр не копируется и не изменяется
+    def __init__(self, net=None, confThreshold=0.7, inputSize=(300, 300), variant=None):
+        if net is None:
+            # без варианта - тот же экземпляр в реестре, что и у остальных модулей
+            net=registry.get('face_ssd') if variant is None else registry.get('face_ssd', variant=variant)
+        self.net=net
+        self.confThreshold=confThreshold
+        self.inputSize=inputSize
+        self.swapRB=faceModels[variant or 'uint8'][2]
+
+    def blob(self, frame):
+        return cv2.dnn.blobFromImage(frame, 1.0, self.inputSize, [104, 117, 123], self.swapRB, False)
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()[0,0]
+
+    def detect(self, frame):
+        frameHeight,frameWidth=frame.shape[:2]
+        return self.decode(self.forward(self.blob(frame)), frameWidth, frameHeight)
+
+    def decode(self, detections, frameWidth, frameHeight):
+        # порог и масштаб для всех детекций сразу: (N, 4) x1,y1,x2,y2
+        detections=detections[detections[:,2]>self.confThreshold]
+        boxes=(detections[:,3:7]*(frameWidth,frameHeight,frameWidth,frameHeight)).astype(np.int32)
+        np.clip(boxes, 0, (frameWidth,frameHeight,frameWidth,frameHeight), out=boxes)
+        return boxes[(boxes[:,2]>boxes[:,0]) & (boxes[:,3]>boxes[:,1])]
+
+
+def toRects(boxes):
+    # x1,y1,x2,y2 -> x,y,w,h (формат detectMultiScale)
+    rects=np.array(boxes, np.int32).reshape(-1, 4).copy()
+    rects[:,2:]-=rects[:,:2]
+    return rects
+
+
+def drawFaceBoxes(frame, boxes):
+    thickness=int(round(frame.shape[0]/150))
+    for x1,y1,x2,y2 in np.asarray(boxes).tolist():
+        cv2.rectangle(frame, (x1,y1), (x2,y2), (0,255,0), thickness, 8)
+    return frame
@@ -1,75 +1,186 @@
+import os
+import time
 import cv2
 import math
+import numpy as np
 import argparse
+from Face_age.face_detector import FaceDetector, drawFaceBoxes
+from gait.utils import metrics, MotionGate, FrameBusReader, ResultCache, frame_valid
+from pipeline.quality import QualityController
+from pipeline import backends
+from pipeline.results_server import serve
+from pipeline.models import registry
 
-def highlightFace(net, frame, conf_threshold=0.7):
-    frameOpencvDnn=frame.copy()
-    frameHeight=frameOpencvDnn.shape[0]
-    frameWidth=frameOpencvDnn.shape[1]
-    blob=cv2.dnn.blobFromImage(frameOpencvDnn, 1.0, (300, 300), [104, 117, 123], True, False)
-
-    net.setInput(blob)
-    detections=net.forward()
-    faceBoxes=[]
-    for i in range(detections.shape[2]):
-        confidence=detections[0,0,i,2]
-        if confidence>conf_threshold:
-            x1=int(detections[0,0,i,3]*frameWidth)
-            y1=int(detections[0,0,i,4]*frameHeight)
-            x2=int(detections[0,0,i,5]*frameWidth)
-            y2=int(detections[0,0,i,6]*frameHeight)
-            faceBoxes.append([x1,y1,x2,y2])
-            cv2.rectangle(frameOpencvDnn, (x1,y1), (x2,y2), (0,255,0), int(round(frameHeight/150)), 8)
-    return frameOpencvDnn,faceBoxes
-
-
-parser=argparse.ArgumentParser()
-parser.add_argument('--image')
-
-args=parser.parse_args()
-
-faceProto="Face_Detection/opencv_face_detector.pbtxt"
-faceModel="Face_Detection/opencv_face_detector_uint8.pb"
-ageProto="Age_Detection/age_deploy.prototxt"
-ageModel="Age_Detection/age_net.caffemodel"
-genderProto="Gender_Detection/gender_deploy.prototxt"
-genderModel="Gender_Detection/gender_net.caffemodel"
+# файлы моделей лежат рядом с модулем, а не в текущем каталоге
+modelDir=os.path.dirname(os.path.abspath(__file__))
+
+ageProto=os.path.join(modelDir, "Age_Detection/age_deploy.prototxt")
+ageModel=os.path.join(modelDir, "Age_Detection/age_net.caffemodel")
+genderProto=os.path.join(modelDir, "Gender_Detection/gender_deploy.prototxt")
+genderModel=os.path.join(modelDir, "Gender_Detection/gender_net.caffemodel")
 
 MODEL_MEAN_VALUES=(78.4263377603, 87.7689143744, 114.895847746)
 ageList=['(0-2)', '(4-6)', '(8-12)', '(15-20)', '(25-32)', '(38-43)', '(48-53)', '(60-100)']
 genderList=['Male','Female']
+padding=20
 
-faceNet=cv2.dnn.readNet(faceModel,faceProto)
-ageNet=cv2.dnn.readNet(ageModel,ageProto)
-genderNet=cv2.dnn.readNet(genderModel,genderProto)
+# размеры входа SSD для адаптивного качества, лучший первым
+qualityLevels=[{'inputSize': 300}, {'inputSize': 240}, {'inputSize': 180}, {'inputSize': 150}]
 
-video=cv2.VideoCapture(args.image if args.image else 0)
-padding=20
-while cv2.waitKey(1)<0:
-    hasFrame,frame=video.read()
-    if not hasFrame:
-        cv2.waitKey()
-        break
-
-    resultImg,faceBoxes=highlightFace(faceNet,frame)
-    if not faceBoxes:
-        print("Лицо не найдено")
-
-    for faceBox in faceBoxes:
-        face=frame[max(0,faceBox[1]-padding):
-                   min(faceBox[3]+padding,frame.shape[0]-1),max(0,faceBox[0]-padding)
-                   :min(faceBox[2]+padding, frame.shape[1]-1)]
-
-        blob=cv2.dnn.blobFromImage(face, 1.0, (227,227), MODEL_MEAN_VALUES, swapRB=False)
-        genderNet.setInput(blob)
-        genderPreds=genderNet.forward()
-        gender=genderList[genderPreds[0].argmax()]
-        print(f'Гендер: {gender}')
-
-        ageNet.setInput(blob)
-        agePreds=ageNet.forward()
-        age=ageList[agePreds[0].argmax()]
-        print(f'Возраст: {age[1:-1]} ')
-
-        cv2.putText(resultImg, f'{gender}, {age}', (faceBox[0], faceBox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2, cv2.LINE_AA)
-        cv2.imshow("Обнаружение ", resultImg)
+
+def loadAgeGenderNets():
+    ageNet=backends.apply(cv2.dnn.readNet(ageModel,ageProto), 'age_gender')
+    genderNet=backends.apply(cv2.dnn.readNet(genderModel,genderProto), 'age_gender')
+    return ageNet,genderNet
+
+
+def warmupAgeGenderNets(nets):
+    for net in nets:
+        net.setInput(np.zeros((1, 3, 227, 227), np.float32))
+        net.forward()
+
+
+def cropFace(frame, faceBox):
+    return frame[max(0,faceBox[1]-padding):
+                 min(faceBox[3]+padding,frame.shape[0]-1),max(0,faceBox[0]-padding)
+                 :min(faceBox[2]+padding, frame.shape[1]-1)]
+
+
+def ageGenderBlob(frame, faceBoxes):
+    faces=[cropFace(frame, faceBox) for faceBox in faceBoxes]
+    return cv2.dnn.blobFromImages(faces, 1.0, (227,227), MODEL_MEAN_VALUES, swapRB=False)
+
+
+def forwardAgeGender(ageNet, genderNet, blob):
+    genderNet.setInput(blob)
+    genderPreds=genderNet.forward()
+    ageNet.setInput(blob)
+    agePreds=ageNet.forward()
+    return agePreds,genderPreds
+
+
+def decodeAgeGender(faceBoxes, agePreds, genderPreds):
+    genderIds=genderPreds.argmax(axis=1)
+    ageIds=agePreds.argmax(axis=1)
+    rows=np.arange(len(genderIds))
+    return [{
+        'box': tuple(faceBox),
+        'gender': genderList[genderId],
+        'genderConfidence': genderConfidence,
+        'age': ageList[ageId],
+        'ageConfidence': ageConfidence,
+    } for faceBox, genderId, genderConfidence, ageId, ageConfidence in zip(
+        np.asarray(faceBoxes).reshape(-1, 4).tolist(), genderIds.tolist(), genderPreds[rows, genderIds].tolist(),
+        ageIds.tolist(), agePreds[rows, ageIds].tolist())]
+
+
+def predictAgeGender(ageNet, genderNet, frame, faceBoxes, cache=None):
+    # все лица кадра одним батчем: по одному forward на каждую сеть
+    if not len(faceBoxes):
+        return []
+    if cache is not None:
+        # сети считают только лица, которых нет в кэше; рамка всегда текущая
+        faceBoxes=np.asarray(faceBoxes).reshape(-1, 4)
+        results=cache.map(frame, faceBoxes, lambda missing: predictAgeGender(ageNet, genderNet, frame, faceBoxes[missing]))
+        return [dict(result, box=tuple(faceBox)) for result, faceBox in zip(results, faceBoxes.tolist())]
+    blob=ageGenderBlob(frame, faceBoxes)
+    agePreds,genderPreds=forwardAgeGender(ageNet, genderNet, blob)
+    return decodeAgeGender(faceBoxes, agePreds, genderPreds)
+
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--image')
+    parser.add_argument('--frame_bus')  # кадры из общей памяти pipeline.camera вместо камеры
+    parser.add_argument('--stats_file')  # статистика задержек (json), пишется периодически
+    parser.add_argument('--stats_interval', type=float, default=5.0)
+    parser.add_argument('--results_port', type=int)  # результаты строками JSON по TCP
+    parser.add_argument('--results_socket')  # или через Unix-сокет
+    parser.add_argument('--metrics_port', type=int)  # локальный endpoint в формате Prometheus
+    parser.add_argument('--latency_budget', type=float)  # мс на кадр, при превышении уменьшаем вход SSD
+    parser.add_argument('--dnn_backend', choices=list(backends.BACKENDS)+['auto'])  # auto: замер при старте
+    parser.add_argument('--face_model', choices=('uint8', 'fp16'))  # по умолчанию uint8
+    parser.add_argument('--motion_gate', action='store_true')  # на статичных кадрах сети не запускаются
+    parser.add_argument('--motion_threshold', type=float, default=0.002)  # доля изменившихся пикселей
+    parser.add_argument('--max_skip', type=int, default=30)  # максимум кадров подряд без сетей
+    parser.add_argument('--result_cache', action='store_true')  # не пересчитывать возраст и пол для неизменившихся лиц
+    parser.add_argument('--cache_size', type=int, default=256)
+    parser.add_argument('--cache_ttl', type=float, default=2.0)  # секунд до пересчета результата из кэша
+
+    args=parser.parse_args()
+    faceOptions={'face_ssd': {'variant': args.face_model}} if args.face_model else None
+    backends.setup(['face_ssd', 'age_gender'], args.dnn_backend, faceOptions)
+
+    faceDetector=FaceDetector(variant=args.face_model)
+    ageNet,genderNet=registry.get('age_gender')
+    cache=ResultCache(args.cache_size, args.cache_ttl) if args.result_cache else None
+    metrics.start_export(args.stats_file, args.stats_interval, args.metrics_port)
+    resultsServer=serve(args.results_port, args.results_socket)
+    frameIndex=0
+
+    controller=None
+    if args.latency_budget is not None:
+        def applyQuality(settings):
+            faceDetector.inputSize=(settings['inputSize'], settings['inputSize'])
+            metrics.set('quality_level', controller.level)
+        controller=QualityController(qualityLevels, args.latency_budget/1000, apply=applyQuality)
+
+    motionGate=None
+    if args.motion_gate:
+        motionGate=MotionGate(min_changed=args.motion_threshold, max_skip=args.max_skip)
+    faceBoxes,results=[],[]
+
+    if args.frame_bus:
+        video=FrameBusReader(args.frame_bus)
+    else:
+        video=cv2.VideoCapture(args.image if args.image else 0)
+    while cv2.waitKey(1)<0:
+        with metrics.timer('capture'):
+            hasFrame,frame=video.read()
+        if not hasFrame:
+            cv2.waitKey()
+            break
+        metrics.inc('frames')
+        # номер кадра в порядке захвата, считая и отброшенные кадры
+        frameIndex+=1
+
+        # статичная сцена: сети не запускаются, рисуем прошлые лица
+        if motionGate is not None and not motionGate.update(frame):
+            metrics.inc('skipped_frames')
+        else:
+            frameStart=time.perf_counter()
+            with metrics.timer('face_detect'):
+                newFaceBoxes=faceDetector.detect(frame)
+            with metrics.timer('age_gender'):
+                newResults=predictAgeGender(ageNet, genderNet, frame, newFaceBoxes, cache)
+            if not frame_valid(video):
+                # слот общей памяти перезаписан во время работы сетей: кадр пропускаем,
+                # на экране остаются прошлые лица
+                metrics.inc('torn_frames')
+                continue
+            faceBoxes,results=newFaceBoxes,newResults
+            metrics.set('faces', len(faceBoxes))
+            if cache is not None:
+                metrics.set('cache_hits', cache.hits)
+                metrics.set('cache_misses', cache.misses)
+            if controller is not None:
+                controller.update(time.perf_counter()-frameStart)
+            if resultsServer is not None:
+                resultsServer.publish('face_age', frameIndex-1, faces=results)
+
+        # рисуем только после того, как все кропы взяты из кадра
+        with metrics.timer('render'):
+            # кадры из общей памяти только для чтения: рисуем на копии
+            resultImg=drawFaceBoxes(frame if frame.flags.writeable else frame.copy(), faceBoxes)
+            for result in results:
+                faceBox=result['box']
+                cv2.putText(resultImg, f'{result["gender"]}, {result["age"]}', (faceBox[0], faceBox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2, cv2.LINE_AA)
+            cv2.imshow("Обнаружение ", resultImg)
+
+    metrics.stop()
+    if resultsServer is not None:
+        resultsServer.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,64 +1,192 @@
+import os
+import argparse
 import cv2 as cv
 import numpy as np
+from detector.streams import MultiStreamDetector
+from pipeline.models import registry
+from gait.utils import metrics, MotionGate
+from pipeline.quality import QualityController
+from pipeline import backends
+from pipeline.results_server import serve
+
+# model files live next to this module, not in the cwd
+modelDir = os.path.dirname(os.path.abspath(__file__))
 
-cap = cv.VideoCapture(0)
 whT = 320
 confThreshold = 0.5
 nmsThreshold = 0.2
 
+# input sizes for the adaptive quality controller, best first (multiples of 32)
+qualityLevels = [{'whT': 320}, {'whT': 256}, {'whT': 192}, {'whT': 128}]
+
 
-classesFile = "coco.names"
+classesFile = os.path.join(modelDir, "coco.names")
 with open(classesFile, 'rt') as f: #open the file and read in text mode
     classNames = f.read().rstrip('\n').split('\n')
-print(classNames)
-
-
-modelConfiguration = "yolov3.cfg"
-modelWeights = "yolov3.weights"
-net = cv.dnn.readNetFromDarknet(modelConfiguration, modelWeights)
-net.setPreferableBackend(cv.dnn.DNN_BACKEND_OPENCV)
-net.setPreferableTarget(cv.dnn.DNN_TARGET_CPU)
-
-
-def findObjects(outputs, img):
-    hT, wT, cT = img.shape
-    bbox = []
-    classIds = []
-    confs = []
-    for output in outputs:
-        for det in output:
-            scores = det[5:]
-            classId = np.argmax(scores)
-            confidence = scores[classId]
-            if confidence > confThreshold:
-                w, h = int(det[2] * wT), int(det[3] * hT)
-                x, y = int((det[0] * wT) - w / 2), int((det[1] * hT) - h / 2)
-                bbox.append([x, y, w, h])
-                classIds.append(classId)
-                confs.append(float(confidence))
-    # print(len(bbox))
-    indices = cv.dnn.NMSBoxes(bbox, confs, confThreshold, nmsThreshold)
-
-    for i in indices:
-        i = indices[0]
-        box = bbox[indices[0]]
-        x, y, w, h = box[0], box[1], box[2], box[3]
+
+
+modelConfiguration = os.path.join(modelDir, "yolov3.cfg")
+modelWeights = os.path.join(modelDir, "yolov3.weights")
+
+
+def loadNet():
+    net = cv.dnn.readNetFromDarknet(modelConfiguration, modelWeights)
+    return backends.apply(net, 'yolo')
+
+
+def getOutputNames(net):
+    layersNames = net.getLayerNames()
+    return [layersNames[i - 1] for i in np.array(net.getUnconnectedOutLayers()).flatten()]
+
+
+def warmupNet(net):
+    net.setInput(np.zeros((1, 3, whT, whT), np.float32))
+    net.forward(getOutputNames(net))
+
+
+class ObjectDetector(object):
+    def __init__(self, classes=None, classThresholds=None, whT=whT):
+        self.whT = whT
+        self.net = registry.get('yolo')
+
+        # output layers are resolved once, not on every frame
+        self.outputNames = getOutputNames(self.net)
+
+        # per-class confidence thresholds, unlisted classes use confThreshold
+        self.classThresholds = np.full(len(classNames), confThreshold, np.float32)
+        for name, value in (classThresholds or {}).items():
+            self.classThresholds[classNames.index(name)] = value
+
+        # allow-list: other classes are dropped before argmax and NMS
+        if classes:
+            self.allowedClassIds = np.array([classNames.index(name) for name in classes])
+        else:
+            self.allowedClassIds = np.arange(len(classNames))
+
+    def decode(self, outputs, wT, hT):
+        # all YOLO rows at once: (N, 5 + classes)
+        det = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+        scores = det[:, 5 + self.allowedClassIds]
+        best = np.argmax(scores, axis=1)
+        confs = scores[np.arange(len(det)), best]
+        classIds = self.allowedClassIds[best]
+
+        keep = confs > self.classThresholds[classIds]
+        det, confs, classIds = det[keep], confs[keep], classIds[keep]
+
+        w = (det[:, 2] * wT).astype(np.int32)
+        h = (det[:, 3] * hT).astype(np.int32)
+        x = (det[:, 0] * wT - w / 2).astype(np.int32)
+        y = (det[:, 1] * hT - h / 2).astype(np.int32)
+        bbox = np.stack((x, y, w, h), axis=1)
+
+        if len(bbox) == 0:
+            return bbox, classIds, confs
+        indices = np.array(cv.dnn.NMSBoxes(bbox.tolist(), confs.tolist(), float(self.classThresholds.min()),
+                                           nmsThreshold), np.int64).flatten()
+        return bbox[indices], classIds[indices], confs[indices]
+
+    def blob(self, img):
+        return cv.dnn.blobFromImage(img, 1 / 255, (self.whT, self.whT), [0, 0, 0], 1, crop=False)
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.outputNames)
+
+    def detect(self, img):
+        hT, wT = img.shape[:2]
+        return self.decode(self.forward(self.blob(img)), wT, hT)
+
+
+def findObjects(detector, img):
+    bbox, classIds, confs = detector.detect(img)
+    drawObjects(img, bbox, classIds, confs)
+    return bbox, classIds, confs
+
+
+def drawObjects(img, bbox, classIds, confs):
+    for (x, y, w, h), classId, conf in zip(bbox.tolist(), classIds.tolist(), confs.tolist()):
         # print(x,y,w,h)
         cv.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        cv.putText(img, f'{classNames[classIds[i]].upper()} {int(confs[i] * 100)}%',
+        cv.putText(img, f'{classNames[classId].upper()} {int(conf * 100)}%',
                    (x, y - 10), cv.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
 
 
-while True:
-    success, img = cap.read()
+def showStream(streamId, resultsServer=None):
+    frameIndex = [0]
+
+    def callback(img, bbox, classIds, confs):
+        if resultsServer is not None:
+            resultsServer.publish('detector', frameIndex[0], stream=streamId, objects=[
+                {'box': box, 'class': classNames[classId], 'confidence': round(conf, 3)}
+                for box, classId, conf in zip(bbox.tolist(), classIds.tolist(), confs.tolist())])
+        frameIndex[0] += 1
+        if not img.flags.writeable:
+            img = img.copy()  # shared-memory frames are read-only, draw on a copy
+        drawObjects(img, bbox, classIds, confs)
+        cv.imshow(f'Image {streamId}', img)
+    return callback
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', nargs='*', default=None)  # e.g. --classes person
+    parser.add_argument('--class_threshold', nargs='*', default=[])  # e.g. person=0.6
+    parser.add_argument('--sources', nargs='*', default=['0'])  # camera ids or video paths/urls
+    parser.add_argument('--batch_size', type=int, default=4)
+    parser.add_argument('--max_wait', type=float, default=0.03)  # seconds to wait for a fuller batch
+    parser.add_argument('--stats_file', default=None)  # periodically flushed latency stats (json)
+    parser.add_argument('--stats_interval', type=float, default=5.0)
+    parser.add_argument('--results_port', type=int, default=None)  # publish detections as JSON lines over TCP
+    parser.add_argument('--results_socket', default=None)  # or over a Unix socket
+    parser.add_argument('--metrics_port', type=int, default=None)  # local Prometheus text endpoint
+    parser.add_argument('--latency_budget', type=float, default=None)  # ms per batch, lowers whT when exceeded
+    parser.add_argument('--motion_gate', action='store_true')  # skip YOLO on static frames of a stream
+    parser.add_argument('--motion_threshold', type=float, default=0.002)  # changed pixel fraction counted as motion
+    parser.add_argument('--max_skip', type=int, default=30)  # max frames in a row without inference
+    parser.add_argument('--dnn_backend', choices=list(backends.BACKENDS) + ['auto'], default=None)
+    args = parser.parse_args()
+    backends.setup(['yolo'], args.dnn_backend)
+
+    classThresholds = {}
+    for item in args.class_threshold:
+        name, value = item.split('=')
+        classThresholds[name] = float(value)
+    objectDetector = ObjectDetector(classes=args.classes, classThresholds=classThresholds)
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    motionGate = None
+    if args.motion_gate:
+        motionGate = lambda: MotionGate(min_changed=args.motion_threshold, max_skip=args.max_skip)
+    detector = MultiStreamDetector(objectDetector.net, objectDetector.outputNames, sources, objectDetector.decode,
+                                   whT=objectDetector.whT, batchSize=args.batch_size, maxWait=args.max_wait,
+                                   motionGate=motionGate)
+    resultsServer = serve(args.results_port, args.results_socket)
+    callbacks = [showStream(i, resultsServer) for i in range(len(sources))]
+    metrics.start_export(args.stats_file, args.stats_interval, args.metrics_port)
+
+    controller = None
+    if args.latency_budget is not None:
+        def applyQuality(settings):
+            detector.whT = objectDetector.whT = settings['whT']
+            metrics.set('whT', settings['whT'])
+        controller = QualityController(qualityLevels, args.latency_budget / 1000, apply=applyQuality)
+
+    while True:
+        if not detector.step(callbacks):
+            break
+        # only blob/forward/decode: waiting for frames and imshow are not inference cost
+        if controller is not None and detector.inferenceTime is not None:
+            controller.update(detector.inferenceTime)
+        if cv.waitKey(1) == 27:  # ESC
+            break
+
+    metrics.stop()
+    if resultsServer is not None:
+        resultsServer.stop()
+    detector.release()
+    cv.destroyAllWindows()
 
-    blob = cv.dnn.blobFromImage(img, 1 / 255, (whT, whT), [0, 0, 0], 1, crop=False)
-    net.setInput(blob)
-    layersNames = net.getLayerNames()
-    print(layersNames)
-    outputNames = [(layersNames[i - 1]) for i in net.getUnconnectedOutLayers()]
-    outputs = net.forward(outputNames)
-    findObjects(outputs, img)
 
-    cv.imshow('Image', img)
-    cv.waitKey(1)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import time
+import threading
+import cv2 as cv
+from gait.utils import metrics, open_capture
+
+
+class StreamReader(object):
+    # keeps only the newest frame of one source, unread frames are dropped
+    def __init__(self, source, cond):
+        # 'bus:name' reads the shared-memory ring of pipeline.camera. No copy: the frame
+        # waits here for the batch, so it is checked with valid(seq) after the blob instead
+        self.cap = open_capture(source, copy=False)
+        self.cond = cond
+        self.frame = None
+        self.seq = None
+        self.stamp = 0.0
+        self.dropped = 0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._update, daemon=True)
+        self.thread.start()
+
+    def _update(self):
+        while True:
+            ret, frame = self.cap.read()
+            with self.cond:
+                if self.stopped:
+                    break
+                if not ret:
+                    self.stopped = True
+                    self.cond.notify_all()
+                    break
+                if self.frame is not None:
+                    self.dropped += 1
+                self.frame = frame
+                self.seq = getattr(self.cap, 'seq', None)
+                self.stamp = time.perf_counter()
+                self.cond.notify_all()
+
+    def take(self):
+        frame, self.frame = self.frame, None
+        return frame, self.seq
+
+    def valid(self, seq):
+        return seq is None or self.cap.valid(seq)
+
+    def release(self):
+        with self.cond:
+            self.stopped = True
+        self.thread.join(timeout=1.0)
+        self.cap.release()
+
+
+class MultiStreamDetector(object):
+    # one network for N sources: latest frames are grouped into one blob
+    def __init__(self, net, outputNames, sources, decode, whT=320, batchSize=4, maxWait=0.03, motionGate=None):
+        self.net = net
+        self.outputNames = outputNames
+        self.decode = decode
+        self.whT = whT
+        self.batchSize = batchSize
+        self.maxWait = maxWait
+        self.cond = threading.Condition()
+        self.readers = [StreamReader(source, self.cond) for source in sources]
+        self.nextStream = 0
+
+        # optional per-stream motion gate (factory): static frames reuse the last result
+        self.gates = [motionGate() for _ in sources] if motionGate is not None else None
+        self.lastResults = {}
+        # blob + forward + decode of the last step, None if no inference ran
+        self.inferenceTime = None
+
+    def _ready(self):
+        return [i for i, reader in enumerate(self.readers) if reader.frame is not None]
+
+    def _collect(self):
+        with self.cond:
+            # wait for the first fresh frame
+            while not self._ready():
+                if all(reader.stopped for reader in self.readers):
+                    return []
+                self.cond.wait(timeout=0.1)
+
+            # then up to maxWait for the batch to fill
+            live = sum(not reader.stopped or reader.frame is not None for reader in self.readers)
+            target = min(self.batchSize, live)
+            deadline = time.perf_counter() + self.maxWait
+            while len(self._ready()) < target:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.cond.wait(timeout=remaining)
+
+            # round-robin start so no stream starves when N > batchSize
+            ready = self._ready()
+            ready = sorted(ready, key=lambda i: (i - self.nextStream) % len(self.readers))[:self.batchSize]
+            self.nextStream = (ready[-1] + 1) % len(self.readers)
+            return [(i,) + self.readers[i].take() for i in ready]
+
+    def step(self, callbacks):
+        self.inferenceTime = None
+        with metrics.timer('batch_wait'):
+            batch = self._collect()
+        if not batch:
+            return False
+        metrics.inc('frames', len(batch))
+
+        if self.gates is not None:
+            static = {streamId for streamId, frame, seq in batch
+                      if not self.gates[streamId].update(frame) and streamId in self.lastResults}
+            for streamId, frame, seq in batch:
+                if streamId in static:
+                    with metrics.timer('render'):
+                        callbacks[streamId](frame, *self.lastResults[streamId])
+            metrics.inc('skipped_frames', len(static))
+            batch = [item for item in batch if item[0] not in static]
+            if not batch:
+                return True
+        metrics.set('batch_size', len(batch))
+
+        frames = [frame for _, frame, _ in batch]
+        inferenceStart = time.perf_counter()
+        with metrics.timer('yolo'):
+            blob = cv.dnn.blobFromImages(frames, 1 / 255, (self.whT, self.whT), [0, 0, 0], 1, crop=False)
+            # shared-memory frames overwritten while waiting for the batch are dropped
+            torn = {n for n, (streamId, _, seq) in enumerate(batch) if not self.readers[streamId].valid(seq)}
+            self.net.setInput(blob)
+            outputs = self.net.forward(self.outputNames)
+        metrics.inc('torn_frames', len(torn))
+        inferenceTime = time.perf_counter() - inferenceStart
+
+        # split the batched outputs back per image
+        for n, (streamId, frame, _) in enumerate(batch):
+            if n in torn:
+                continue
+            streamOutputs = [output.reshape(len(batch), -1, output.shape[-1])[n] for output in outputs]
+            hT, wT = frame.shape[:2]
+            decodeStart = time.perf_counter()
+            with metrics.timer('decode'):
+                bbox, classIds, confs = self.decode(streamOutputs, wT, hT)
+            inferenceTime += time.perf_counter() - decodeStart
+            self.lastResults[streamId] = (bbox, classIds, confs)
+            with metrics.timer('render'):
+                callbacks[streamId](frame, bbox, classIds, confs)
+        self.inferenceTime = inferenceTime
+        metrics.set('dropped_frames', sum(self.dropped()))
+        return True
+
+    def dropped(self):
+        with self.cond:
+            return [reader.dropped for reader in self.readers]
+
+    def release(self):
+        for reader in self.readers:
+            reader.release()
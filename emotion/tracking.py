@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack(object):
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.points = None
+        self.probs = None
+        self.last_classified = None
+
+    @property
+    def label_index(self):
+        return None if self.probs is None else int(np.argmax(self.probs))
+
+
+class FaceTracker(object):
+    # face detection every detect_interval frames (or on track loss),
+    # optical flow in between; emotion distribution smoothed per track
+    def __init__(self, detect, classifier, detect_interval=10, classify_interval=5,
+                 smoothing=0.3, iou_threshold=0.3, min_points=4):
+        self.detect = detect
+        self.classifier = classifier
+        self.detect_interval = detect_interval
+        self.classify_interval = classify_interval
+        self.smoothing = smoothing
+        self.iou_threshold = iou_threshold
+        self.min_points = min_points
+
+        self.tracks = []
+        self.next_id = 0
+        self.frame_index = 0
+        self.last_detection = None
+        self.prev_gray = None
+        self.lost = False
+
+    def update(self, test_img, gray_img):
+        due = (self.last_detection is None or self.lost
+               or self.frame_index - self.last_detection >= self.detect_interval)
+        if due:
+            self._detect(test_img, gray_img)
+        else:
+            self._flow(gray_img)
+        self._classify(gray_img)
+
+        self.prev_gray = gray_img
+        self.frame_index += 1
+        return self.tracks
+
+    def _detect(self, test_img, gray_img):
+        faces = [tuple(int(v) for v in face) for face in self.detect(test_img, gray_img)]
+
+        # greedy IoU matching keeps ids stable across detections
+        unmatched = list(self.tracks)
+        tracks = []
+        for box in faces:
+            best, best_iou = None, self.iou_threshold
+            for track in unmatched:
+                iou = box_iou(box, track.box)
+                if iou >= best_iou:
+                    best, best_iou = track, iou
+            if best is None:
+                best = FaceTrack(self.next_id, box)
+                self.next_id += 1
+            else:
+                unmatched.remove(best)
+                best.box = box
+            best.points = self._features(gray_img, box)
+            tracks.append(best)
+
+        self.tracks = tracks
+        self.last_detection = self.frame_index
+        self.lost = False
+
+    def _features(self, gray_img, box):
+        x, y, w, h = box
+        corners = cv2.goodFeaturesToTrack(gray_img[y:y+h, x:x+w], maxCorners=20,
+                                          qualityLevel=0.01, minDistance=3)
+        if corners is None:
+            return np.empty((0, 1, 2), np.float32)
+        return corners + np.array([x, y], np.float32)
+
+    def _flow(self, gray_img):
+        tracked = [track for track in self.tracks if len(track.points) > 0]
+        if not tracked:
+            self.lost = bool(self.tracks)
+            return
+
+        # one LK call for the points of all tracks
+        points = np.concatenate([track.points for track in tracked])
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray_img, points, None)
+        status = status.ravel().astype(bool)
+
+        start = 0
+        for track in tracked:
+            end = start + len(track.points)
+            ok = status[start:end]
+            if ok.sum() < self.min_points:
+                self.lost = True
+            else:
+                dx, dy = np.median(moved[start:end][ok] - points[start:end][ok], axis=0).ravel()
+                x, y, w, h = track.box
+                track.box = (int(round(x + dx)), int(round(y + dy)), w, h)
+                track.points = moved[start:end][ok].reshape(-1, 1, 2)
+            start = end
+
+    def _classify(self, gray_img):
+        height, width = gray_img.shape[:2]
+        due = []
+        for track in self.tracks:
+            x, y, w, h = track.box
+            if x < 0 or y < 0 or x + w > width or y + h > height:
+                continue
+            if (track.last_classified is None
+                    or self.frame_index - track.last_classified >= self.classify_interval):
+                due.append(track)
+        if not due:
+            return
+
+        probs = self.classifier.predict_proba(gray_img, [track.box for track in due])
+        for track, p in zip(due, probs):
+            # exponential moving average of the emotion distribution
+            if track.probs is None:
+                track.probs = p
+            else:
+                track.probs = (1 - self.smoothing) * track.probs + self.smoothing * p
+            track.last_classified = self.frame_index
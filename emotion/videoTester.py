@@ -1,56 +1,262 @@
 import os
+import time
+import argparse
 import cv2
 import numpy as np
-from keras.models import model_from_json
-from keras.utils import img_to_array
+from emotion.tracking import FaceTracker
+from Face_age.face_detector import FaceDetector, toRects
+from gait.utils import metrics, MotionGate, FrameBusReader, ResultCache, frame_valid
+from pipeline.models import registry
+from pipeline.quality import QualityController
+from pipeline import backends
+from pipeline.results_server import serve
 
 
+# model files live next to this module, not in the cwd
+model_dir = os.path.dirname(os.path.abspath(__file__))
 
-#load model
-model = model_from_json(open("fer.json", "r").read())
-#load weights
-model.load_weights('fer.h5')
+emotions = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
 
+# adaptive quality levels, best first: SSD input size, Haar scale factor,
+# multiplier of the detection interval in --track mode
+quality_levels = [
+    {'input_size': 300, 'scale_factor': 1.32, 'interval_scale': 1.0},
+    {'input_size': 240, 'scale_factor': 1.4, 'interval_scale': 1.5},
+    {'input_size': 180, 'scale_factor': 1.5, 'interval_scale': 2.0},
+    {'input_size': 150, 'scale_factor': 1.7, 'interval_scale': 3.0},
+]
 
-face_haar_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
 
+def load_model():
+    # keras is imported here so importing this module stays cheap
+    from keras.models import model_from_json
 
-cap=cv2.VideoCapture(0)
+    #load model
+    model = model_from_json(open(os.path.join(model_dir, "fer.json"), "r").read())
+    #load weights
+    model.load_weights(os.path.join(model_dir, 'fer.h5'))
+    return model
 
-while True:
-    ret,test_img=cap.read()# captures frame and returns boolean value and captured image
-    if not ret:
-        continue
-    gray_img= cv2.cvtColor(test_img, cv2.COLOR_BGR2GRAY)
 
-    faces_detected = face_haar_cascade.detectMultiScale(gray_img, 1.32, 5)
+def warmup_model(model):
+    model.predict_on_batch(np.zeros((1, 48, 48, 1), np.float32))
 
 
-    for (x,y,w,h) in faces_detected:
-        cv2.rectangle(test_img,(x,y),(x+w,y+h),(255,0,0),thickness=7)
-        roi_gray=gray_img[y:y+w,x:x+h]#cropping region of interest i.e. face area from  image
-        roi_gray=cv2.resize(roi_gray,(48,48))
-        img_pixels = img_to_array(roi_gray)
-        img_pixels = np.expand_dims(img_pixels, axis = 0)
-        img_pixels /= 255
+def load_face_cascade():
+    return cv2.CascadeClassifier(os.path.join(model_dir, 'haarcascade_frontalface_default.xml'))
+
+
+def make_face_detector(name='ssd', settings=None):
+    # returns detect(test_img, gray_img) -> faces as x,y,w,h;
+    # settings is read on every call, so it can be changed at runtime
+    if settings is None:
+        settings = dict(quality_levels[0])
+    if name == 'haar':
+        face_haar_cascade = load_face_cascade()
+        return lambda test_img, gray_img: face_haar_cascade.detectMultiScale(gray_img, settings['scale_factor'], 5)
+    # shared SSD stage, the same one Face_age uses
+    face_detector = FaceDetector()
+
+    def detect(test_img, gray_img):
+        face_detector.inputSize = (settings['input_size'], settings['input_size'])
+        return toRects(face_detector.detect(test_img))
+    return detect
+
+
+class EmotionClassifier(object):
+    # all faces of a frame go through one predict call
+    def __init__(self, model, capacity=8, cache=None):
+        self.model = model
+        self.cache = cache  # optional ResultCache: unchanged faces skip the model
+        self.faces = np.empty((capacity, 48, 48), np.uint8)
+        self.batch = np.empty((capacity, 48, 48, 1), np.float32)
+
+    def prepare(self, gray_img, faces_detected):
+        n = len(faces_detected)
+        if n > len(self.batch):
+            self.faces = np.empty((n, 48, 48), np.uint8)
+            self.batch = np.empty((n, 48, 48, 1), np.float32)
+
+        for i, (x,y,w,h) in enumerate(faces_detected):
+            roi_gray=gray_img[y:y+h,x:x+w]#cropping region of interest i.e. face area from  image
+            cv2.resize(roi_gray,(48,48),dst=self.faces[i])
+        np.multiply(self.faces[:n], 1 / 255, out=self.batch[:n, :, :, 0])
+        return self.batch[:n]
+
+    def forward(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
 
-        predictions = model.predict(img_pixels)
+    def predict_proba(self, gray_img, faces_detected):
+        if len(faces_detected) == 0:
+            return np.empty((0, len(emotions)), np.float32)
+        if self.cache is not None:
+            boxes = [(x, y, x + w, y + h) for x, y, w, h in faces_detected]
+            return np.asarray(self.cache.map(gray_img, boxes, lambda missing: self.forward(
+                self.prepare(gray_img, [faces_detected[i] for i in missing]))))
+        return self.forward(self.prepare(gray_img, faces_detected))
+
+    def predict(self, gray_img, faces_detected):
+        predictions = self.predict_proba(gray_img, faces_detected)
 
         #find max indexed array
-        max_index = np.argmax(predictions[0])
+        max_index = np.argmax(predictions, axis=1)
+
+        return [emotions[i] for i in max_index]
+
+
+def predict_emotions(test_img, gray_img, detect_faces, classifier):
+    faces_detected = detect_faces(test_img, gray_img)
 
-        emotions = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
-        predicted_emotion = emotions[max_index]
+    return faces_detected, classifier.predict(gray_img, faces_detected)
 
+
+def draw_emotions(test_img, gray_img, detect_faces, classifier):
+    draw_faces(test_img, *predict_emotions(test_img, gray_img, detect_faces, classifier))
+
+
+def draw_faces(test_img, faces_detected, predicted_emotions):
+    for (x,y,w,h), predicted_emotion in zip(faces_detected, predicted_emotions):
+        cv2.rectangle(test_img,(x,y),(x+w,y+h),(255,0,0),thickness=7)
         cv2.putText(test_img, predicted_emotion, (int(x), int(y)), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
 
-    resized_img = cv2.resize(test_img, (1000, 700))
-    cv2.imshow('Facial emotion analysis ',resized_img)
 
+def draw_tracks(test_img, tracks):
+    for track in tracks:
+        x,y,w,h = track.box
+        cv2.rectangle(test_img,(x,y),(x+w,y+h),(255,0,0),thickness=7)
+        if track.label_index is not None:
+            cv2.putText(test_img, f'{track.track_id}: {emotions[track.label_index]}', (int(x), int(y)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--track', action='store_true')  # detect every N frames, follow faces in between
+    parser.add_argument('--detect_interval', type=int, default=10)
+    parser.add_argument('--classify_interval', type=int, default=5)
+    parser.add_argument('--smoothing', type=float, default=0.3)
+    parser.add_argument('--face_detector', choices=('ssd', 'haar'), default='ssd')
+    parser.add_argument('--stats_file', default=None)  # periodically flushed latency stats (json)
+    parser.add_argument('--stats_interval', type=float, default=5.0)
+    parser.add_argument('--frame_bus', default=None)  # shared-memory frames from pipeline.camera instead of the camera
+    parser.add_argument('--results_port', type=int, default=None)  # publish emotions as JSON lines over TCP
+    parser.add_argument('--results_socket', default=None)  # or over a Unix socket
+    parser.add_argument('--metrics_port', type=int, default=None)  # local Prometheus text endpoint
+    parser.add_argument('--latency_budget', type=float, default=None)  # ms per frame, lowers detection quality when exceeded
+    parser.add_argument('--dnn_backend', choices=list(backends.BACKENDS) + ['auto'], default=None)  # for the face SSD
+    parser.add_argument('--motion_gate', action='store_true')  # reuse the last faces on static frames
+    parser.add_argument('--motion_threshold', type=float, default=0.002)  # changed pixel fraction counted as motion
+    parser.add_argument('--max_skip', type=int, default=30)  # max frames in a row without inference
+    parser.add_argument('--result_cache', action='store_true')  # reuse predictions for faces that did not change
+    parser.add_argument('--cache_size', type=int, default=256)
+    parser.add_argument('--cache_ttl', type=float, default=2.0)  # seconds before a cached prediction is recomputed
+    args = parser.parse_args()
+    if args.face_detector == 'ssd':
+        backends.setup(['face_ssd'], args.dnn_backend)
+
+    cache = ResultCache(args.cache_size, args.cache_ttl) if args.result_cache else None
+    classifier = EmotionClassifier(registry.get('emotion'), cache=cache)
+    detector_settings = dict(quality_levels[0])
+    detect_faces = metrics.timer('face_detect')(make_face_detector(args.face_detector, detector_settings))
+    # instance attribute shadows the method, so predict() and the tracker are timed too
+    classifier.predict_proba = metrics.timer('emotion')(classifier.predict_proba)
+    metrics.start_export(args.stats_file, args.stats_interval, args.metrics_port)
+    results_server = serve(args.results_port, args.results_socket)
+    frame_index = 0
+
+    tracker = None
+    if args.track:
+        tracker = FaceTracker(detect_faces, classifier,
+                              detect_interval=args.detect_interval,
+                              classify_interval=args.classify_interval, smoothing=args.smoothing)
+
+    controller = None
+    if args.latency_budget is not None:
+        def apply_quality(settings):
+            detector_settings.update(settings)
+            if tracker is not None:
+                tracker.detect_interval = int(args.detect_interval * settings['interval_scale'])
+            metrics.set('quality_level', controller.level)
+        controller = QualityController(quality_levels, args.latency_budget / 1000, apply=apply_quality)
+
+    motion_gate = None
+    if args.motion_gate:
+        motion_gate = MotionGate(min_changed=args.motion_threshold, max_skip=args.max_skip)
+    tracks = []
+    faces_detected, predicted_emotions = [], []
+
+    cap = FrameBusReader(args.frame_bus) if args.frame_bus else cv2.VideoCapture(0)
+
+    while True:
+        with metrics.timer('capture'):
+            ret,test_img=cap.read()# captures frame and returns boolean value and captured image
+        if not ret:
+            if not cap.isOpened():
+                break
+            continue
+        metrics.inc('frames')
+        frame_index += 1  # capture order, dropped frames included
+
+        # static scene: models are skipped, the last faces are drawn again
+        run_models = motion_gate is None or motion_gate.update(test_img)
+        if not run_models:
+            metrics.inc('skipped_frames')
+
+        frame_start = time.perf_counter()
+        with metrics.timer('frame'):
+            if run_models:
+                gray_img= cv2.cvtColor(test_img, cv2.COLOR_BGR2GRAY)
+                if tracker is not None:
+                    new_tracks = tracker.update(test_img, gray_img)
+                else:
+                    new_faces, new_emotions = predict_emotions(test_img, gray_img, detect_faces, classifier)
+                if not frame_valid(cap):
+                    # shared-memory slot was overwritten during inference: drop the frame,
+                    # the last valid faces stay on screen
+                    metrics.inc('torn_frames')
+                    continue
+                if tracker is not None:
+                    tracks = new_tracks
+                    metrics.set('faces', len(tracks))
+                else:
+                    faces_detected, predicted_emotions = new_faces, new_emotions
+
+            if not test_img.flags.writeable:
+                test_img = test_img.copy()  # shared-memory frames are read-only, draw on a copy
+            if tracker is not None:
+                draw_tracks(test_img, tracks)
+            else:
+                draw_faces(test_img, faces_detected, predicted_emotions)
+        if controller is not None and run_models:
+            controller.update(time.perf_counter() - frame_start)
+        if cache is not None:
+            metrics.set('cache_hits', cache.hits)
+            metrics.set('cache_misses', cache.misses)
+        if results_server is not None and run_models:
+            if tracker is not None:
+                faces = [{'box': track.box, 'track_id': track.track_id,
+                          'emotion': None if track.label_index is None else emotions[track.label_index]}
+                         for track in tracks]
+            else:
+                faces = [{'box': box, 'emotion': emotion}
+                         for box, emotion in zip(np.asarray(faces_detected).tolist(), predicted_emotions)]
+            results_server.publish('emotion', frame_index - 1, faces=faces)
+
+        with metrics.timer('display'):
+            resized_img = cv2.resize(test_img, (1000, 700))
+            cv2.imshow('Facial emotion analysis ',resized_img)
+
+
+
+        if cv2.waitKey(10) == ord('q'):#wait until 'q' key is pressed
+            break
 
+    metrics.stop()
+    if results_server is not None:
+        results_server.stop()
+    cap.release()
+    cv2.destroyAllWindows()
 
-    if cv2.waitKey(10) == ord('q'):#wait until 'q' key is pressed
-        break
 
-cap.release()
-cv2.destroyAllWindows
\ No newline at end of file
+if __name__ == '__main__':
+    main()
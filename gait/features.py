@@ -0,0 +1,185 @@
+import numpy as np
+
+# Нумерация как в gait.py: нечетные индексы - правая сторона
+DISTANCE_PAIRS = np.array([
+    [11, 12],  # плечи
+    [23, 24],  # талия
+    [27, 28],  # лодыжки
+])
+ANGLE_TRIPLETS = np.array([
+    [23, 25, 27],  # правое колено
+    [24, 26, 28],  # левое колено
+    [11, 23, 25],  # правое бедро
+    [12, 24, 26],  # левое бедро
+])
+FEATURE_NAMES = (
+    'shoulder_width',
+    'hip_width',
+    'ankle_distance',
+    'right_knee_angle',
+    'left_knee_angle',
+    'right_hip_angle',
+    'left_hip_angle',
+)
+SHOULDER_WIDTH = FEATURE_NAMES.index('shoulder_width')
+HIP_WIDTH = FEATURE_NAMES.index('hip_width')
+ANKLE_DISTANCE = FEATURE_NAMES.index('ankle_distance')
+KNEE_ANGLES = (FEATURE_NAMES.index('right_knee_angle'),
+               FEATURE_NAMES.index('left_knee_angle'))
+ANGLES = slice(FEATURE_NAMES.index('right_knee_angle'), len(FEATURE_NAMES))
+# hip/shoulder, ankle mean/std, 4 угла mean/std, частота шага, симметрия
+EMBEDDING_SIZE = 3 + 2 * (len(FEATURE_NAMES) - 3) + 2
+
+
+def calc_frame_features(landmark_array):
+    points = landmark_array[:, :2].astype(np.float64)
+
+    pair_vectors = points[DISTANCE_PAIRS[:, 1]] - points[DISTANCE_PAIRS[:, 0]]
+    distances = np.hypot(pair_vectors[:, 0], pair_vectors[:, 1])
+
+    vectors01 = points[ANGLE_TRIPLETS[:, 0]] - points[ANGLE_TRIPLETS[:, 1]]
+    vectors02 = points[ANGLE_TRIPLETS[:, 2]] - points[ANGLE_TRIPLETS[:, 1]]
+    norms = np.linalg.norm(vectors01, axis=1) * np.linalg.norm(vectors02,
+                                                               axis=1)
+    cos = np.einsum('ij,ij->i', vectors01, vectors02) / np.maximum(
+        norms, 1e-9)
+    angles = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+    return np.concatenate((distances, angles))
+
+
+class GaitFeatureEngine(object):
+    def __init__(self, window=128, min_step_hz=0.5, max_step_hz=4.0):
+        self._window = window
+        self._min_step_hz = min_step_hz
+        self._max_step_hz = max_step_hz
+
+        # Кольцевой буфер признаков и времени кадров
+        self._features = np.zeros((window, len(FEATURE_NAMES)), np.float64)
+        self._timestamps = np.zeros(window, np.float64)
+        self._asymmetry = np.zeros((window, 2), np.float64)
+        self._head = 0
+        self._count = 0
+
+        # Скользящие суммы: среднее и симметрия за O(1) на кадр
+        self._feature_sum = np.zeros(len(FEATURE_NAMES), np.float64)
+        self._asymmetry_sum = np.zeros(2, np.float64)
+
+        # Скользящее ДПФ дистанции между лодыжками: O(window) на кадр
+        self._bins = np.arange(1, window // 2 + 1)
+        self._twiddle = np.exp(2j * np.pi * self._bins / window)
+        self._spectrum = np.zeros(len(self._bins), np.complex128)
+
+    def update(self, landmark_array, timestamp):
+        features = calc_frame_features(landmark_array)
+        knee_right, knee_left = features[KNEE_ANGLES[0]], features[
+            KNEE_ANGLES[1]]
+        asymmetry = (abs(knee_right - knee_left), (knee_right + knee_left) / 2)
+
+        head = self._head
+        old_sample = self._features[head, ANKLE_DISTANCE]
+        new_sample = features[ANKLE_DISTANCE]
+
+        self._feature_sum += features - self._features[head]
+        self._asymmetry_sum += np.subtract(asymmetry, self._asymmetry[head])
+        self._features[head] = features
+        self._asymmetry[head] = asymmetry
+        self._timestamps[head] = timestamp
+
+        self._spectrum = (self._spectrum + new_sample -
+                          old_sample) * self._twiddle
+
+        self._head = (head + 1) % self._window
+        self._count = min(self._count + 1, self._window)
+
+        # Раз в окно пересчитываем накопители заново против дрейфа
+        if self._head == 0:
+            self._resync()
+
+        return self.get()
+
+    def _resync(self):
+        # Вызывается при head == 0: буфер уже упорядочен по времени
+        self._feature_sum = self._features.sum(axis=0)
+        self._asymmetry_sum = self._asymmetry.sum(axis=0)
+        self._spectrum = np.fft.rfft(
+            self._features[:, ANKLE_DISTANCE])[self._bins]
+
+    def reset(self):
+        self.__init__(self._window, self._min_step_hz, self._max_step_hz)
+
+    def window_array(self):
+        # Признаки окна от старого кадра к новому
+        if self._count < self._window:
+            return self._features[:self._count].copy()
+        return np.roll(self._features, -self._head, axis=0)
+
+    def sample_rate(self):
+        if self._count < 2:
+            return 0.0
+        first = (self._head - self._count) % self._window
+        last = (self._head - 1) % self._window
+        span = self._timestamps[last] - self._timestamps[first]
+        if span <= 0:
+            return 0.0
+        return (self._count - 1) / span
+
+    def step_frequency(self):
+        # Частота шага по пику спектра в диапазоне походки
+        rate = self.sample_rate()
+        if self._count < self._window or rate <= 0:
+            return None
+        frequencies = self._bins * rate / self._window
+        band = np.flatnonzero((frequencies >= self._min_step_hz)
+                              & (frequencies <= self._max_step_hz))
+        if len(band) == 0:
+            return None
+        magnitude = np.abs(self._spectrum)
+        peak = band[np.argmax(magnitude[band])]
+
+        # Параболическая интерполяция пика между соседними бинами
+        offset = 0.0
+        if 0 < peak < len(magnitude) - 1:
+            left, center, right = magnitude[peak - 1:peak + 2]
+            denominator = left - 2 * center + right
+            if denominator != 0:
+                offset = 0.5 * (left - right) / denominator
+        return (self._bins[peak] + offset) * rate / self._window
+
+    def embedding(self):
+        # Вектор фиксированной длины для индекса подписей (только полное окно)
+        step_hz = self.step_frequency()
+        if step_hz is None:
+            return None
+        window = self._features
+        shoulder = max(window[:, SHOULDER_WIDTH].mean(), 1e-9)
+        symmetry = self.get()['symmetry'] or 0.0
+        return np.concatenate((
+            [
+                window[:, HIP_WIDTH].mean() / shoulder,
+                window[:, ANKLE_DISTANCE].mean() / shoulder,
+                window[:, ANKLE_DISTANCE].std() / shoulder,
+            ],
+            window[:, ANGLES].mean(axis=0) / 180.0,
+            window[:, ANGLES].std(axis=0) / 180.0,
+            [step_hz / self._max_step_hz, symmetry],
+        )).astype(np.float32)
+
+    def get(self):
+        if self._count == 0:
+            return None
+        latest = self._features[(self._head - 1) % self._window]
+        step_hz = self.step_frequency()
+        symmetry = None
+        if self._asymmetry_sum[1] > 0:
+            symmetry = float(
+                np.clip(1.0 - self._asymmetry_sum[0] / self._asymmetry_sum[1],
+                        0.0, 1.0))
+        return {
+            'features': dict(zip(FEATURE_NAMES, latest.tolist())),
+            'mean': dict(
+                zip(FEATURE_NAMES, (self._feature_sum / self._count).tolist())),
+            'cadence': None if step_hz is None else step_hz * 60.0,
+            'stride_period': None if step_hz is None else 2.0 / step_hz,
+            'symmetry': symmetry,
+        }
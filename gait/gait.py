@@ -1,12 +1,33 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import copy
+import os
+import time
 import math
 import argparse
 import cv2 as cv
 import numpy as np
 import mediapipe as mp
-from utils import CvFpsCalc
+from gait.utils import CvFpsCalc, LatestFrameCapture, MotionGate, metrics, FrameBusReader
+from gait.landmark_store import LandmarkWriter
+from gait.features import GaitFeatureEngine, EMBEDDING_SIZE
+from gait.signatures import GaitSignatureIndex
+from gait.sequence_match import GaitSequenceMatcher
+from pipeline.models import registry
+from pipeline.quality import QualityController
+from pipeline.results_server import serve
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Ребра скелета: глаза, рот, плечи, руки, кисти, торс, ноги
+POSE_EDGES = np.array([
+    (1, 2), (2, 3), (4, 5), (5, 6), (9, 10), (11, 12),
+    (11, 13), (13, 15), (12, 14), (14, 16),
+    (15, 17), (17, 19), (19, 21), (21, 15),
+    (16, 18), (18, 20), (20, 22), (22, 16),
+    (11, 23), (12, 24), (23, 24),
+    (23, 25), (25, 27), (27, 29), (29, 31),
+    (24, 26), (26, 28), (28, 30), (30, 32),
+])
 
 
 def get_args():
@@ -15,6 +36,11 @@ def get_args():
     parser.add_argument("--device", type=int, default=0)
     parser.add_argument("--width", help='cap width', type=int, default=640)
     parser.add_argument("--height", help='cap height', type=int, default=360)
+    parser.add_argument('--threaded_capture', action='store_true')
+    parser.add_argument("--frame_bus",
+                        help='read frames from pipeline.camera (shared memory)',
+                        type=str,
+                        default=None)
 
     parser.add_argument('--static_image_mode', action='store_true')
     parser.add_argument("--model_complexity",
@@ -31,6 +57,82 @@ def get_args():
                         default=0.75)
 
     parser.add_argument('--rev_color', action='store_true')
+    parser.add_argument("--render_every",
+                        help='draw every Nth frame',
+                        type=int,
+                        default=1)
+    parser.add_argument('--no_render', action='store_true')
+    parser.add_argument('--motion_gate',
+                        help='skip pose on static frames',
+                        action='store_true')
+    parser.add_argument("--motion_threshold",
+                        help='changed pixel fraction counted as motion',
+                        type=float,
+                        default=0.002)
+    parser.add_argument("--max_skip",
+                        help='max frames in a row without inference',
+                        type=int,
+                        default=30)
+    parser.add_argument("--latency_budget",
+                        help='ms per frame; lowers pose input size/complexity',
+                        type=float,
+                        default=None)
+    parser.add_argument('--draw_z', action='store_true')
+    parser.add_argument("--feature_window",
+                        help='gait feature window (frames)',
+                        type=int,
+                        default=128)
+    parser.add_argument("--signature_index",
+                        help='gait signature index directory',
+                        type=str,
+                        default=None)
+    parser.add_argument("--enroll_id",
+                        help='enroll the walking person under this id',
+                        type=int,
+                        default=None)
+    parser.add_argument("--match_threshold", type=float, default=0.05)
+    parser.add_argument("--sequence_gallery",
+                        help='gait sequence gallery (.npz) matched with DTW',
+                        type=str,
+                        default=None)
+    parser.add_argument("--sequence_threshold", type=float, default=20.0)
+
+    parser.add_argument('--multi_person',
+                        help='YOLO person crops, one Pose per tracked person',
+                        action='store_true')
+    parser.add_argument("--pose_workers",
+                        help='Pose worker processes (0: in-process)',
+                        type=int,
+                        default=2)
+    parser.add_argument("--max_persons", type=int, default=8)
+
+    parser.add_argument("--input",
+                        help='video file or directory (headless mode)',
+                        type=str,
+                        default=None)
+    parser.add_argument("--output",
+                        help='landmark output directory',
+                        type=str,
+                        default='landmarks')
+    parser.add_argument("--chunk_size", type=int, default=1024)
+
+    parser.add_argument("--stats_file",
+                        help='periodically flushed latency stats (json)',
+                        type=str,
+                        default=None)
+    parser.add_argument("--stats_interval", type=float, default=5.0)
+    parser.add_argument("--results_port",
+                        help='publish results as JSON lines over TCP',
+                        type=int,
+                        default=None)
+    parser.add_argument("--results_socket",
+                        help='publish results over a Unix socket',
+                        type=str,
+                        default=None)
+    parser.add_argument("--metrics_port",
+                        help='local Prometheus text endpoint port',
+                        type=int,
+                        default=None)
 
     args = parser.parse_args()
 
@@ -41,6 +143,10 @@ def main():
     #Анализ аргументов
     args = get_args()
 
+    if args.input is not None:
+        run_offline(args)
+        return
+
     cap_device = args.device
     cap_width = args.width
     cap_height = args.height
@@ -50,24 +156,65 @@ def main():
     min_detection_confidence = args.min_detection_confidence
     min_tracking_confidence = args.min_tracking_confidence
 
+    threaded_capture = args.threaded_capture
+
     rev_color = args.rev_color
 
     # Подготовка камеры
-    cap = cv.VideoCapture(cap_device)
-    cap.set(cv.CAP_PROP_FRAME_WIDTH, cap_width)
-    cap.set(cv.CAP_PROP_FRAME_HEIGHT, cap_height)
+    if args.frame_bus is not None:
+        # Кадры декодирует pipeline.camera, здесь только чтение из общей памяти
+        cap = FrameBusReader(args.frame_bus)
+    else:
+        cap = cv.VideoCapture(cap_device)
+        cap.set(cv.CAP_PROP_FRAME_WIDTH, cap_width)
+        cap.set(cv.CAP_PROP_FRAME_HEIGHT, cap_height)
+    if threaded_capture and args.frame_bus is None:
+        # Фоновое чтение: обработка всегда берет самый свежий кадр
+        cap.set(cv.CAP_PROP_BUFFERSIZE, 1)
+        cap = LatestFrameCapture(cap)
+
+    if args.multi_person:
+        run_multi_person(args, cap)
+        return
 
     # Загрузка модели
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(
+    pose_kwargs = dict(
         static_image_mode=static_image_mode,
-        model_complexity=model_complexity,
         min_detection_confidence=min_detection_confidence,
         min_tracking_confidence=min_tracking_confidence,
     )
-
-    #Модуль измерения FPS
-    cvFpsCalc = CvFpsCalc(buffer_len=10)
+    pose = registry.get('pose',
+                        model_complexity=model_complexity,
+                        **pose_kwargs)
+
+    # Адаптивное качество: при нехватке времени уменьшаем вход и модель
+    controller = None
+    input_scale = 1.0
+    if args.latency_budget is not None:
+        controller = QualityController(quality_levels(model_complexity),
+                                       args.latency_budget / 1000.0)
+
+    #Модуль измерения FPS и задержек по стадиям
+    cvFpsCalc = CvFpsCalc(buffer_len=10, histogram=metrics.histogram('frame'))
+    metrics.start_export(args.stats_file, args.stats_interval,
+                         args.metrics_port)
+    results_server = serve(args.results_port, args.results_socket)
+
+    # Признаки походки (скользящее окно)
+    feature_engine = GaitFeatureEngine(window=args.feature_window)
+    gait_features = None
+
+    # Индекс подписей походки: запись (--enroll_id) или опознание
+    signature_index = None
+    person_id = None
+    frame_count = 0
+    if args.signature_index is not None:
+        signature_index = GaitSignatureIndex(args.signature_index,
+                                             EMBEDDING_SIZE)
+    # Галерея последовательностей признаков: сравнение окон целиком по DTW
+    sequence_matcher = None
+    if args.sequence_gallery is not None:
+        sequence_matcher = GaitSequenceMatcher.open(args.sequence_gallery)
 
     # Спецификация цвета
     if rev_color:
@@ -77,105 +224,366 @@ def main():
         color = (100, 33, 3)
         bg_color = (255, 255, 255)
 
+    # Кадр для отрисовки: каждый render_every-й, 0 - без отрисовки
+    render_every = 0 if args.no_render else max(args.render_every, 1)
+    debug_image02 = None
+    frame_index = 0
+    landmark_array = None
+    motion_gate = None
+    if args.motion_gate:
+        motion_gate = MotionGate(min_changed=args.motion_threshold,
+                                 max_skip=args.max_skip)
+
     while True:
         display_fps = cvFpsCalc.get()
 
         #Захват камеры
-        ret, image = cap.read()
+        with metrics.timer('capture'):
+            ret, image = cap.read()
         if not ret:
             break
+        metrics.inc('frames')
         image = cv.flip(image, 1)  # Зеркальный дисплей
-        debug_image01 = copy.deepcopy(image)
-        debug_image02 = np.zeros((image.shape[0], image.shape[1], 3), np.uint8)
-        cv.rectangle(debug_image02, (0, 0), (image.shape[1], image.shape[0]),
-                    bg_color,
-                    thickness=-1)
-
-        # Реализация обнаружения
-        image = cv.cvtColor(image, cv.COLOR_BGR2RGB)
-        results = pose.process(image)
+        render = render_every > 0 and frame_index % render_every == 0
+        frame_index += 1
 
-        #Рисунок
-        if results.pose_landmarks is not None:
-            # Рисунок
-            debug_image01 = draw_landmarks(
-                debug_image01,
-                results.pose_landmarks,
-            )
-            debug_image02 = draw_stick_figure(
-                debug_image02,
-                results.pose_landmarks,
-                color=color,
-                bg_color=bg_color,
-            )
+        frame_start = time.perf_counter()
 
-        cv.putText(debug_image01, "FPS:" + str(display_fps), (10, 30),
-                   cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2, cv.LINE_AA)
-        cv.putText(debug_image02, "FPS:" + str(display_fps), (10, 30),
-                   cv.FONT_HERSHEY_SIMPLEX, 1.0, color, 2, cv.LINE_AA)
+        # Статичная сцена: модель не запускается, остаются прошлые ориентиры
+        run_models = motion_gate is None or motion_gate.update(image)
+        if not run_models:
+            metrics.inc('skipped_frames')
+        else:
+            # Реализация обнаружения (BGR-кадр остается холстом для рисунка)
+            rgb_image = cv.cvtColor(image, cv.COLOR_BGR2RGB)
+            if input_scale != 1.0:
+                # Ориентиры нормированы, поэтому масштаб на них не влияет
+                rgb_image = cv.resize(rgb_image, None, fx=input_scale,
+                                      fy=input_scale,
+                                      interpolation=cv.INTER_AREA)
+            with metrics.timer('pose'):
+                results = pose.process(rgb_image)
+
+            landmark_array = None
+            if results.pose_landmarks is not None:
+                # Один массив ориентиров в пикселях для всех потребителей
+                with metrics.timer('features'):
+                    landmark_array = scale_landmark_array(
+                        calc_landmark_array(results.pose_landmarks),
+                        image.shape[1], image.shape[0])
+                    gait_features = feature_engine.update(landmark_array,
+                                                          time.perf_counter())
+                frame_count += 1
+
+                # Раз в окно: новая подпись -> запись или поиск в индексе
+                if (signature_index is not None
+                        and frame_count % args.feature_window == 0):
+                    embedding = feature_engine.embedding()
+                    if embedding is not None:
+                        if args.enroll_id is not None:
+                            signature_index.enroll([args.enroll_id], embedding)
+                        elif len(signature_index) > 0:
+                            person_id = int(
+                                signature_index.identify(
+                                    embedding, args.match_threshold)[0])
+                if (sequence_matcher is not None
+                        and frame_count % args.feature_window == 0):
+                    sequence = feature_engine.window_array()
+                    if args.enroll_id is not None:
+                        sequence_matcher.enroll([args.enroll_id], [sequence])
+                    elif len(sequence_matcher) > 0:
+                        person_id = sequence_matcher.identify(
+                            sequence, args.sequence_threshold)
+                        metrics.set('dtw_pruned', sequence_matcher.pruned)
+
+        if results_server is not None and run_models:
+            results_server.publish('gait',
+                                   frame_index - 1,
+                                   landmarks=landmark_array,
+                                   gait=gait_features,
+                                   person_id=person_id)
+
+        if threaded_capture:
+            dropped = cap.get_dropped()
+            metrics.set('dropped_frames', dropped)
+
+        if controller is not None and run_models:
+            settings = controller.update(time.perf_counter() - frame_start)
+            if settings is not None:
+                # Модели кэшируются в реестре: возврат на уровень мгновенный
+                pose = registry.get('pose',
+                                    model_complexity=settings[
+                                        'model_complexity'],
+                                    **pose_kwargs)
+                input_scale = settings['scale']
+                metrics.set('quality_level', controller.level)
+
+        if render_every == 0:
+            continue
+        if render:
+            #Рисунок
+            with metrics.timer('render'):
+                debug_image01 = image
+                if debug_image02 is None or debug_image02.shape != image.shape:
+                    debug_image02 = np.empty_like(image)
+                if landmark_array is not None:
+                    draw_landmarks(debug_image01,
+                                   landmark_array,
+                                   draw_z=args.draw_z)
+                    # Фон заливается внутри draw_stick_figure
+                    draw_stick_figure(
+                        debug_image02,
+                        landmark_array,
+                        color=color,
+                        bg_color=bg_color,
+                    )
+                else:
+                    debug_image02[:] = bg_color
+
+                draw_status(debug_image01, debug_image02, display_fps,
+                            gait_features, person_id,
+                            dropped if threaded_capture else None, color)
+
+            # Отражение экрана
+            cv.imshow('Izob', debug_image01)
+            cv.imshow('Pictogram', debug_image02)
 
         #Обработка клавиш (ESC: конец)
         key = cv.waitKey(1)
         if key == 27:  # ESC
             break
 
-        # Отражение экрана
-        cv.imshow('Izob', debug_image01)
-        cv.imshow('Pictogram', debug_image02)
+    if sequence_matcher is not None and args.enroll_id is not None:
+        sequence_matcher.save(args.sequence_gallery)
+    if results_server is not None:
+        results_server.stop()
+    metrics.stop()
+    cap.release()
+    cv.destroyAllWindows()
+
 
+def quality_levels(model_complexity):
+    # Лучшее качество первым: сначала вход меньше, затем модель проще
+    levels = [{'model_complexity': model_complexity, 'scale': 1.0},
+              {'model_complexity': model_complexity, 'scale': 0.75}]
+    for complexity in range(model_complexity - 1, -1, -1):
+        levels.append({'model_complexity': complexity, 'scale': 0.75})
+    levels.append({'model_complexity': 0, 'scale': 0.5})
+    return levels
+
+
+def run_multi_person(args, cap):
+    # Импорт здесь: multi_pose сам импортирует этот модуль
+    from detector.detector import ObjectDetector
+    from gait.multi_pose import MultiPersonPose
+
+    detector = ObjectDetector(classes=['person'])
+    multi_pose = MultiPersonPose(
+        workers=args.pose_workers,
+        max_persons=args.max_persons,
+        feature_window=args.feature_window,
+        static_image_mode=args.static_image_mode,
+        model_complexity=args.model_complexity,
+        min_detection_confidence=args.min_detection_confidence,
+        min_tracking_confidence=args.min_tracking_confidence,
+    )
+    cvFpsCalc = CvFpsCalc(buffer_len=10, histogram=metrics.histogram('frame'))
+    metrics.start_export(args.stats_file, args.stats_interval,
+                         args.metrics_port)
+    results_server = serve(args.results_port, args.results_socket)
+
+    render_every = 0 if args.no_render else max(args.render_every, 1)
+    frame_index = 0
+    persons = []
+    motion_gate = None
+    if args.motion_gate:
+        motion_gate = MotionGate(min_changed=args.motion_threshold,
+                                 max_skip=args.max_skip)
+    while True:
+        display_fps = cvFpsCalc.get()
+
+        with metrics.timer('capture'):
+            ret, image = cap.read()
+        if not ret:
+            break
+        metrics.inc('frames')
+        image = cv.flip(image, 1)  # Зеркальный дисплей
+        image_height, image_width = image.shape[:2]
+        render = render_every > 0 and frame_index % render_every == 0
+        frame_index += 1
+
+        if motion_gate is not None and not motion_gate.update(image):
+            # Статичная сцена: остаются люди с прошлого кадра
+            metrics.inc('skipped_frames')
+        else:
+            # Люди по убыванию уверенности, прямоугольники x1, y1, x2, y2
+            with metrics.timer('yolo'):
+                bbox, _, confs = detector.detect(image)
+            boxes = []
+            for index in np.argsort(-confs, kind='stable').tolist():
+                x, y, w, h = bbox[index].tolist()
+                x1, y1 = max(x, 0), max(y, 0)
+                x2, y2 = min(x + w, image_width), min(y + h, image_height)
+                if x2 > x1 and y2 > y1:
+                    boxes.append((x1, y1, x2, y2))
+
+            with metrics.timer('pose'):
+                persons = multi_pose.process(image, boxes,
+                                             time.perf_counter())
+            metrics.set('persons', len(persons))
+            if results_server is not None:
+                results_server.publish('gait',
+                                       frame_index - 1,
+                                       persons=persons)
+
+        if render_every == 0:
+            continue
+        if render:
+            with metrics.timer('render'):
+                for person in persons:
+                    x1, y1, x2, y2 = person['box']
+                    cv.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    label = "ID:" + str(person['track_id'])
+                    if person['gait'] is not None and person['gait'][
+                            'cadence'] is not None:
+                        label += " CADENCE:" + str(
+                            round(person['gait']['cadence'], 1))
+                    cv.putText(image, label, (x1, y1 - 10),
+                               cv.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2,
+                               cv.LINE_AA)
+                    if person['landmarks'] is not None:
+                        draw_landmarks(image, person['landmarks'],
+                                       draw_z=args.draw_z)
+                cv.putText(image, "FPS:" + str(display_fps), (10, 30),
+                           cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2,
+                           cv.LINE_AA)
+            cv.imshow('Izob', image)
+
+        key = cv.waitKey(1)
+        if key == 27:  # ESC
+            break
+
+    multi_pose.close()
+    if results_server is not None:
+        results_server.stop()
+    metrics.stop()
     cap.release()
     cv.destroyAllWindows()
 
 
+def draw_status(debug_image01, debug_image02, display_fps, gait_features,
+                person_id, dropped, color):
+    height = debug_image02.shape[0]
+    cv.putText(debug_image01, "FPS:" + str(display_fps), (10, 30),
+               cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2, cv.LINE_AA)
+    cv.putText(debug_image02, "FPS:" + str(display_fps), (10, 30),
+               cv.FONT_HERSHEY_SIMPLEX, 1.0, color, 2, cv.LINE_AA)
+    if gait_features is not None and gait_features['cadence'] is not None:
+        cv.putText(debug_image02,
+                   "CADENCE:" + str(round(gait_features['cadence'], 1)),
+                   (10, height - 20), cv.FONT_HERSHEY_SIMPLEX, 0.7, color, 2,
+                   cv.LINE_AA)
+    if person_id is not None:
+        cv.putText(debug_image02, "ID:" + str(person_id), (10, height - 50),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.7, color, 2, cv.LINE_AA)
+    if dropped is not None:
+        cv.putText(debug_image01, "DROP:" + str(dropped), (10, 60),
+                   cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2, cv.LINE_AA)
+        cv.putText(debug_image02, "DROP:" + str(dropped), (10, 60),
+                   cv.FONT_HERSHEY_SIMPLEX, 1.0, color, 2, cv.LINE_AA)
+
+
+def load_pose(**kwargs):
+    return mp.solutions.pose.Pose(**kwargs)
+
+
+def warmup_pose(pose):
+    pose.process(np.zeros((256, 256, 3), np.uint8))
+
+
+def run_offline(args):
+    # Без окон: видеофайл (или каталог файлов) -> колонки ориентиров на диске
+    if os.path.isdir(args.input):
+        video_paths = sorted(
+            os.path.join(args.input, name) for name in os.listdir(args.input)
+            if name.lower().endswith(VIDEO_EXTENSIONS))
+        output_paths = [
+            os.path.join(args.output,
+                         os.path.splitext(os.path.basename(path))[0])
+            for path in video_paths
+        ]
+    else:
+        video_paths = [args.input]
+        output_paths = [args.output]
+
+    mp_pose = mp.solutions.pose
+    for video_path, output_path in zip(video_paths, output_paths):
+        # Новый экземпляр Pose на каждый файл: трекинг не переносится
+        with mp_pose.Pose(
+                static_image_mode=args.static_image_mode,
+                model_complexity=args.model_complexity,
+                min_detection_confidence=args.min_detection_confidence,
+                min_tracking_confidence=args.min_tracking_confidence,
+        ) as pose, LandmarkWriter(output_path,
+                                  chunk_size=args.chunk_size) as writer:
+            process_video(video_path, pose, writer)
+
+
+def process_video(video_path, pose, writer):
+    cap = cv.VideoCapture(video_path)
+    frame_index = 0
+    while True:
+        ret, image = cap.read()
+        if not ret:
+            break
+        timestamp = cap.get(cv.CAP_PROP_POS_MSEC) / 1000.0
+
+        image = cv.cvtColor(image, cv.COLOR_BGR2RGB)
+        results = pose.process(image)
+
+        landmark_array = None
+        if results.pose_landmarks is not None:
+            landmark_array = calc_landmark_array(results.pose_landmarks)
+        writer.append(frame_index, timestamp, landmark_array)
+        frame_index += 1
+    cap.release()
+    return frame_index
+
+
+def calc_landmark_array(landmarks):
+    # (33, 4) float32: x, y, z, visibility в нормированных координатах
+    return np.array([(landmark.x, landmark.y, landmark.z, landmark.visibility)
+                     for landmark in landmarks.landmark], np.float32)
+
+
+def scale_landmark_array(landmark_array, image_width, image_height):
+    # Перевод x, y в пиксели одной операцией (с усечением как у int())
+    pixel_array = landmark_array.copy()
+    pixel_array[:, :2] = np.minimum(
+        np.trunc(landmark_array[:, :2] * (image_width, image_height)),
+        (image_width - 1, image_height - 1))
+    return pixel_array
+
+
 def draw_stick_figure(
         image,
-        landmarks,
+        landmark_array,
         color=(100, 33, 3),
         bg_color=(255, 255, 255),
         visibility_th=0.5,
 ):
     image_width, image_height = image.shape[1], image.shape[0]
 
-    # Расчет каждого ориентира
-    landmark_point = []
-    for index, landmark in enumerate(landmarks.landmark):
-        landmark_x = min(int(landmark.x * image_width), image_width - 1)
-        landmark_y = min(int(landmark.y * image_height), image_height - 1)
-        landmark_z = landmark.z
-        landmark_point.append(
-            [index, landmark.visibility, (landmark_x, landmark_y), landmark_z])
+    # Ориентиры уже в пикселях: (33, 4) x, y, z, visibility
+    points = landmark_array[:, :2].astype(np.int32)
+    landmark_z = landmark_array[:, 2]
+    visibility = landmark_array[:, 3]
 
-
-    pose_pairs = [[11, 12], [23, 24], [27, 28]]
     # Исправлено положение основания ноги до середины талии.
-    right_leg = landmark_point[23]
-    left_leg = landmark_point[24]
-    #print("l - ", landmark_point[24][2], "   r - ", landmark_point[23][2])
-    #print("l - ", landmark_point[12], "   r - ", landmark_point[11])
-    leg_x = int((right_leg[2][0] + left_leg[2][0]) / 2)
-    leg_y = int((right_leg[2][1] + left_leg[2][1]) / 2)
-    for pair in pose_pairs:
-        x1 = landmark_point[pair[0]][2][0]; y1 = landmark_point[pair[0]][2][1]
-        x2 = landmark_point[pair[1]][2][0]; y2 = landmark_point[pair[1]][2][1]
-        #print(pair[0], " -> ", x1, " ", y1, "  ", pair[1], " -> ", x2, " ", y2)
-        distance_btw = ((((x2 - x1)**2) + ((y2 - y1)** 2))** 0.5)
-        print(pair[0]," ",pair[1]," ",int(distance_btw))
-        if abs(float("{0:.3f}".format(landmark_point[pair[0]][3]))) == abs(float("{0:.3f}".format(landmark_point[pair[1]][3]))):
-             print("zaebis ", int(distance_btw))
-        else:
-             print(abs(float("{0:.3f}".format(landmark_point[pair[0]][3]))), "    ", abs(float("{0:.3f}".format(landmark_point[pair[1]][3]))))
-
-
-    landmark_point[23][2] = (leg_x, leg_y)
-    landmark_point[24][2] = (leg_x, leg_y)
-
-    # Сортировать по расстоянию
-    sorted_landmark_point = sorted(landmark_point,
-                                   reverse=True,
-                                   key=lambda x: x[3])
+    points[23] = points[24] = ((points[23] + points[24]) / 2).astype(np.int32)
 
     # Расчет каждого размера
-    (face_x, face_y), face_radius = min_enclosing_face_circle(landmark_point)
+    (face_x, face_y), face_radius = min_enclosing_face_circle(points)
 
     face_x = int(face_x)
     face_y = int(face_y)
@@ -186,12 +594,15 @@ def draw_stick_figure(
     stick_radius03 = int(stick_radius02 * (3 / 4))
 
     # Нарисовать список целей
-    draw_list = [
+    draw_list = np.array([
         11,  # Правая рука
         12,  # Левая рука
         23,  # Правая нога
         24,  # Левая нога
-    ]
+    ])
+
+    # Сортировать по расстоянию
+    draw_list = draw_list[np.argsort(-landmark_z[draw_list], kind='stable')]
 
     # Фоновый цвет
     cv.rectangle(image, (0, 0), (image_width, image_height),
@@ -202,50 +613,36 @@ def draw_stick_figure(
     cv.circle(image, (face_x, face_y), face_radius, color, -1)
 
     # Рисунок руки/ноги
-    for landmark_info in sorted_landmark_point:
-        index = landmark_info[0]
-
-        if index in draw_list:
-            point01 = [p for p in landmark_point if p[0] == index][0]
-            point02 = [p for p in landmark_point if p[0] == (index + 2)][0]
-            point03 = [p for p in landmark_point if p[0] == (index + 4)][0]
-
-            if point01[1] > visibility_th and point02[1] > visibility_th:
-                image = draw_stick(
-                    image,
-                    point01[2],
-                    stick_radius01,
-                    point02[2],
-                    stick_radius02,
-                    color=color,
-                    bg_color=bg_color,
-                )
-            if point02[1] > visibility_th and point03[1] > visibility_th:
-                image = draw_stick(
-                    image,
-                    point02[2],
-                    stick_radius02,
-                    point03[2],
-                    stick_radius03,
-                    color=color,
-                    bg_color=bg_color,
-                )
+    points = [tuple(point) for point in points.tolist()]
+    visible = (visibility > visibility_th).tolist()
+    for index in draw_list.tolist():
+        if visible[index] and visible[index + 2]:
+            image = draw_stick(
+                image,
+                points[index],
+                stick_radius01,
+                points[index + 2],
+                stick_radius02,
+                color=color,
+                bg_color=bg_color,
+            )
+        if visible[index + 2] and visible[index + 4]:
+            image = draw_stick(
+                image,
+                points[index + 2],
+                stick_radius02,
+                points[index + 4],
+                stick_radius03,
+                color=color,
+                bg_color=bg_color,
+            )
 
     return image
 
 
-def min_enclosing_face_circle(landmark_point):
-    landmark_array = np.empty((0, 2), int)
-
+def min_enclosing_face_circle(points):
     index_list = [1, 4, 7, 8, 9, 10]
-    for index in index_list:
-        np_landmark_point = [
-            np.array(
-                (landmark_point[index][2][0], landmark_point[index][2][1]))
-        ]
-        landmark_array = np.append(landmark_array, np_landmark_point, axis=0)
-
-    center, radius = cv.minEnclosingCircle(points=landmark_array)
+    center, radius = cv.minEnclosingCircle(points=points[index_list])
 
     return center, radius
 
@@ -285,236 +682,30 @@ def draw_stick(
 
 def draw_landmarks(
     image,
-    landmarks,
-    #только верхняя часть тела,
+    landmark_array,
     visibility_th=0.5,
+    draw_z=False,
+    color=(0, 255, 0),
 ):
-    image_width, image_height = image.shape[1], image.shape[0]
-
-    landmark_point = []
-
-    for index, landmark in enumerate(landmarks.landmark):
-        landmark_x = min(int(landmark.x * image_width), image_width - 1)
-        landmark_y = min(int(landmark.y * image_height), image_height - 1)
-        landmark_z = landmark.z
-        landmark_point.append([landmark.visibility, (landmark_x, landmark_y)])
-
-        if landmark.visibility < visibility_th:
-            continue
-
-        if index == 0:  # нос
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 1:  #Правый глаз: внутренний угол глаза
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 2:  # Правый глаз
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 3:  # Правый глаз: внешний угол глаза
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 4:  #Левый глаз: внутренний угол глаза
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 5:  #Левый глаз: Глаза
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 6:  #Левый глаз: внешний угол глаза
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 7:  # Правое ухо
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 8: # левое ухо
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 9:  # Рот: правый конец
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 10:  # Рот: левый конец
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 11:  # Правое плечо
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 12:  # левое плечо
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 13:  # правый локоть
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 14:  # Левый локоть
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 15:  # правая рука
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 16:  #Левое запястье
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 17:  # Правая рука 1 (внешний конец)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 18:  # Левая рука 1 (внешний конец)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 19:  # Правая рука 2 (наконечник)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 20:  # Левая рука 2 (наконечник)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 21:  # Правая рука 3 (медиальный конец
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 22:  # Левая рука 3 (внутренний конец)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 23:  # Талия (правая сторона)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 24:  # талия (левая сторона)
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 25:  # Правое колено
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 26:  #левое колено
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 27:  # Правая лодыжка
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 28:  #Левая лодыжка
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 29:  # Правая пятка
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 30:  #левая пятка
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 31:  # Правый палец
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-        if index == 32:  # Левый палец ноги
-            cv.circle(image, (landmark_x, landmark_y), 5, (0, 255, 0), 2)
-
-        # если не только верхняя часть тела:
-        if True:
-            cv.putText(image, "z:" + str(round(landmark_z, 3)),
-                       (landmark_x - 10, landmark_y - 10),
-                       cv.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1,
-                       cv.LINE_AA)
-
-    # Правый глаз
-    if landmark_point[1][0] > visibility_th and landmark_point[2][
-            0] > visibility_th:
-        cv.line(image, landmark_point[1][1], landmark_point[2][1],
-                (0, 255, 0), 2)
-    if landmark_point[2][0] > visibility_th and landmark_point[3][
-            0] > visibility_th:
-        cv.line(image, landmark_point[2][1], landmark_point[3][1],
-                (0, 255, 0), 2)
-
-    #Левый глаз
-    if landmark_point[4][0] > visibility_th and landmark_point[5][
-            0] > visibility_th:
-        cv.line(image, landmark_point[4][1], landmark_point[5][1],
-                (0, 255, 0), 2)
-    if landmark_point[5][0] > visibility_th and landmark_point[6][
-            0] > visibility_th:
-        cv.line(image, landmark_point[5][1], landmark_point[6][1],
-                (0, 255, 0), 2)
-
-    # рот
-    if landmark_point[9][0] > visibility_th and landmark_point[10][
-            0] > visibility_th:
-        cv.line(image, landmark_point[9][1], landmark_point[10][1],
-                (0, 255, 0), 2)
-
-    # плечи
-    if landmark_point[11][0] > visibility_th and landmark_point[12][
-            0] > visibility_th:
-        cv.line(image, landmark_point[11][1], landmark_point[12][1],
-                (0, 255, 0), 2)
-
-    # Правая рука
-    if landmark_point[11][0] > visibility_th and landmark_point[13][
-            0] > visibility_th:
-        cv.line(image, landmark_point[11][1], landmark_point[13][1],
-                (0, 255, 0), 2)
-    if landmark_point[13][0] > visibility_th and landmark_point[15][
-            0] > visibility_th:
-        cv.line(image, landmark_point[13][1], landmark_point[15][1],
-                (0, 255, 0), 2)
-
-    # Левая рука
-    if landmark_point[12][0] > visibility_th and landmark_point[14][
-            0] > visibility_th:
-        cv.line(image, landmark_point[12][1], landmark_point[14][1],
-                (0, 255, 0), 2)
-    if landmark_point[14][0] > visibility_th and landmark_point[16][
-            0] > visibility_th:
-        cv.line(image, landmark_point[14][1], landmark_point[16][1],
-                (0, 255, 0), 2)
-
-    # правая рука
-    if landmark_point[15][0] > visibility_th and landmark_point[17][
-            0] > visibility_th:
-        cv.line(image, landmark_point[15][1], landmark_point[17][1],
-                (0, 255, 0), 2)
-    if landmark_point[17][0] > visibility_th and landmark_point[19][
-            0] > visibility_th:
-        cv.line(image, landmark_point[17][1], landmark_point[19][1],
-                (0, 255, 0), 2)
-    if landmark_point[19][0] > visibility_th and landmark_point[21][
-            0] > visibility_th:
-        cv.line(image, landmark_point[19][1], landmark_point[21][1],
-                (0, 255, 0), 2)
-    if landmark_point[21][0] > visibility_th and landmark_point[15][
-            0] > visibility_th:
-        cv.line(image, landmark_point[21][1], landmark_point[15][1],
-                (0, 255, 0), 2)
-
-    # левая рука
-    if landmark_point[16][0] > visibility_th and landmark_point[18][
-            0] > visibility_th:
-        cv.line(image, landmark_point[16][1], landmark_point[18][1],
-                (0, 255, 0), 2)
-    if landmark_point[18][0] > visibility_th and landmark_point[20][
-            0] > visibility_th:
-        cv.line(image, landmark_point[18][1], landmark_point[20][1],
-                (0, 255, 0), 2)
-    if landmark_point[20][0] > visibility_th and landmark_point[22][
-            0] > visibility_th:
-        cv.line(image, landmark_point[20][1], landmark_point[22][1],
-                (0, 255, 0), 2)
-    if landmark_point[22][0] > visibility_th and landmark_point[16][
-            0] > visibility_th:
-        cv.line(image, landmark_point[22][1], landmark_point[16][1],
-                (0, 255, 0), 2)
-
-    #Торс
-    if landmark_point[11][0] > visibility_th and landmark_point[23][
-            0] > visibility_th:
-        cv.line(image, landmark_point[11][1], landmark_point[23][1],
-                (0, 255, 0), 2)
-    if landmark_point[12][0] > visibility_th and landmark_point[24][
-            0] > visibility_th:
-        cv.line(image, landmark_point[12][1], landmark_point[24][1],
-                (0, 255, 0), 2)
-    if landmark_point[23][0] > visibility_th and landmark_point[24][
-            0] > visibility_th:
-        cv.line(image, landmark_point[23][1], landmark_point[24][1],
-                (0, 255, 0), 2)
-
-    if len(landmark_point) > 25:
-        # Правая нога
-        if landmark_point[23][0] > visibility_th and landmark_point[25][
-                0] > visibility_th:
-            cv.line(image, landmark_point[23][1], landmark_point[25][1],
-                    (0, 255, 0), 2)
-        if landmark_point[25][0] > visibility_th and landmark_point[27][
-                0] > visibility_th:
-            cv.line(image, landmark_point[25][1], landmark_point[27][1],
-                    (0, 255, 0), 2)
-        if landmark_point[27][0] > visibility_th and landmark_point[29][
-                0] > visibility_th:
-            cv.line(image, landmark_point[27][1], landmark_point[29][1],
-                    (0, 255, 0), 2)
-        if landmark_point[29][0] > visibility_th and landmark_point[31][
-                0] > visibility_th:
-            cv.line(image, landmark_point[29][1], landmark_point[31][1],
-                    (0, 255, 0), 2)
-
-        #Левая нога
-        if landmark_point[24][0] > visibility_th and landmark_point[26][
-                0] > visibility_th:
-            cv.line(image, landmark_point[24][1], landmark_point[26][1],
-                    (0, 255, 0), 2)
-        if landmark_point[26][0] > visibility_th and landmark_point[28][
-                0] > visibility_th:
-            cv.line(image, landmark_point[26][1], landmark_point[28][1],
-                    (0, 255, 0), 2)
-        if landmark_point[28][0] > visibility_th and landmark_point[30][
-                0] > visibility_th:
-            cv.line(image, landmark_point[28][1], landmark_point[30][1],
-                    (0, 255, 0), 2)
-        if landmark_point[30][0] > visibility_th and landmark_point[32][
-                0] > visibility_th:
-            cv.line(image, landmark_point[30][1], landmark_point[32][1],
-                    (0, 255, 0), 2)
+    points = landmark_array[:, :2].astype(np.int32)
+    visibility = landmark_array[:, 3]
+
+    # Точки: одна ветка для всех видимых ориентиров
+    for index in np.flatnonzero(visibility >= visibility_th).tolist():
+        point = tuple(points[index].tolist())
+        cv.circle(image, point, 5, color, 2)
+        if draw_z:
+            cv.putText(image, "z:" + str(round(float(landmark_array[index, 2]),
+                                                3)),
+                       (point[0] - 10, point[1] - 10),
+                       cv.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv.LINE_AA)
+
+    # Линии: все видимые ребра скелета одним вызовом
+    visible = visibility > visibility_th
+    edges = POSE_EDGES[visible[POSE_EDGES[:, 0]] & visible[POSE_EDGES[:, 1]]]
+    cv.polylines(image, points[edges], False, color, 2)
     return image
 
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,104 @@
+import os
+import glob
+
+import numpy as np
+
+LANDMARK_COUNT = 33
+COLUMNS = ('frame', 'timestamp', 'x', 'y', 'z', 'visibility')
+
+
+class LandmarkWriter(object):
+    def __init__(self, path, chunk_size=1024):
+        self._path = path
+        self._chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+        # Дозапись: продолжаем нумерацию уже существующих чанков
+        self._chunk_index = len(_chunk_files(path))
+
+        self._frame = np.empty(chunk_size, np.int64)
+        self._timestamp = np.empty(chunk_size, np.float64)
+        self._landmarks = np.empty((chunk_size, LANDMARK_COUNT, 4),
+                                   np.float32)
+        self._count = 0
+
+    def append(self, frame_index, timestamp, landmark_array):
+        i = self._count
+        self._frame[i] = frame_index
+        self._timestamp[i] = timestamp
+        if landmark_array is None:
+            # Поза не найдена: координаты NaN, видимость 0
+            self._landmarks[i, :, :3] = np.nan
+            self._landmarks[i, :, 3] = 0.0
+        else:
+            self._landmarks[i] = landmark_array
+        self._count += 1
+        if self._count == self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._count == 0:
+            return
+        n = self._count
+        file_path = os.path.join(self._path,
+                                 '{:06d}.npz'.format(self._chunk_index))
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                frame=self._frame[:n],
+                timestamp=self._timestamp[:n],
+                x=self._landmarks[:n, :, 0],
+                y=self._landmarks[:n, :, 1],
+                z=self._landmarks[:n, :, 2],
+                visibility=self._landmarks[:n, :, 3],
+            )
+        os.replace(tmp_path, file_path)
+        self._chunk_index += 1
+        self._count = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _chunk_files(path):
+    return sorted(glob.glob(os.path.join(path, '[0-9]*.npz')))
+
+
+def iter_chunks(path, columns=COLUMNS):
+    for file_path in _chunk_files(path):
+        with np.load(file_path) as chunk:
+            yield {name: chunk[name] for name in columns}
+
+
+def iter_landmarks(path):
+    for chunk in iter_chunks(path):
+        landmarks = np.stack(
+            (chunk['x'], chunk['y'], chunk['z'], chunk['visibility']),
+            axis=-1)
+        for i in range(len(chunk['frame'])):
+            yield int(chunk['frame'][i]), float(
+                chunk['timestamp'][i]), landmarks[i]
+
+
+def load_landmarks(path):
+    frames = []
+    timestamps = []
+    landmarks = []
+    for chunk in iter_chunks(path):
+        frames.append(chunk['frame'])
+        timestamps.append(chunk['timestamp'])
+        landmarks.append(
+            np.stack((chunk['x'], chunk['y'], chunk['z'],
+                      chunk['visibility']),
+                     axis=-1))
+    if not frames:
+        return (np.empty(0, np.int64), np.empty(0, np.float64),
+                np.empty((0, LANDMARK_COUNT, 4), np.float32))
+    return (np.concatenate(frames), np.concatenate(timestamps),
+            np.concatenate(landmarks))
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import queue
+import importlib
+import multiprocessing
+import cv2 as cv
+
+from gait.gait import calc_landmark_array, scale_landmark_array
+from gait.features import GaitFeatureEngine
+
+POSE_LOADER = 'gait.gait:load_pose'
+
+
+def _resolve(path):
+    module_name, function_name = path.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def box_iou(a, b):
+    # Прямоугольники x1, y1, x2, y2
+    iw = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) -
+             inter)
+    return inter / union if union > 0 else 0.0
+
+
+class PersonTracker(object):
+    # Жадное сопоставление по IoU: номер трека сохраняется между кадрами,
+    # трек удаляется, если его не видно max_age кадров
+    def __init__(self, iou_threshold=0.3, max_age=15):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks = {}
+        self.next_id = 0
+        self.expired = []
+
+    def update(self, boxes):
+        unmatched = dict(self.tracks)
+        track_ids = []
+        for box in boxes:
+            best_id, best_iou = None, self.iou_threshold
+            for track_id, track in unmatched.items():
+                iou = box_iou(box, track['box'])
+                if iou >= best_iou:
+                    best_id, best_iou = track_id, iou
+            if best_id is None:
+                best_id = self.next_id
+                self.next_id += 1
+            else:
+                del unmatched[best_id]
+            self.tracks[best_id] = {'box': tuple(box), 'age': 0}
+            track_ids.append(best_id)
+
+        self.expired = []
+        for track_id in unmatched:
+            self.tracks[track_id]['age'] += 1
+            if self.tracks[track_id]['age'] > self.max_age:
+                del self.tracks[track_id]
+                self.expired.append(track_id)
+        return track_ids
+
+
+class _PoseSet(object):
+    # Свой экземпляр Pose на каждый трек: состояние слежения не сбрасывается
+    def __init__(self, loader, pose_kwargs):
+        self.load = _resolve(loader)
+        self.pose_kwargs = pose_kwargs
+        self.poses = {}
+
+    def run(self, crops, expired):
+        for track_id in expired:
+            self._close(track_id)
+        results = []
+        for track_id, crop in crops:
+            if track_id not in self.poses:
+                self.poses[track_id] = self.load(**self.pose_kwargs)
+            pose_results = self.poses[track_id].process(crop)
+            results.append((track_id, None
+                            if pose_results.pose_landmarks is None else
+                            calc_landmark_array(pose_results.pose_landmarks)))
+        return results
+
+    def _close(self, track_id):
+        pose = self.poses.pop(track_id, None)
+        if pose is not None and hasattr(pose, 'close'):
+            pose.close()
+
+    def close(self):
+        for track_id in list(self.poses):
+            self._close(track_id)
+
+
+def _pose_worker(loader, pose_kwargs, tasks, results):
+    pose_set = _PoseSet(loader, pose_kwargs)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        frame_id, crops, expired = task
+        results.put((frame_id, pose_set.run(crops, expired)))
+    pose_set.close()
+
+
+class PoseWorkerPool(object):
+    # Трек всегда попадает в один и тот же процесс (track_id % workers);
+    # workers=0 - обработка в текущем процессе
+    def __init__(self, workers=2, loader=POSE_LOADER, **pose_kwargs):
+        self.workers = workers
+        self._frame_id = 0
+        if workers == 0:
+            self._local = _PoseSet(loader, pose_kwargs)
+            return
+
+        # spawn: дочерние процессы не наследуют камеру и потоки захвата
+        context = multiprocessing.get_context('spawn')
+        self._results = context.Queue()
+        self._tasks = [context.Queue() for _ in range(workers)]
+        self._processes = [
+            context.Process(target=_pose_worker,
+                            args=(loader, pose_kwargs, tasks, self._results),
+                            daemon=True) for tasks in self._tasks
+        ]
+        for process in self._processes:
+            process.start()
+
+    def process(self, crops, expired=()):
+        # crops: [(track_id, rgb-кроп)] -> {track_id: (33, 4) или None}
+        if self.workers == 0:
+            return dict(self._local.run(crops, expired))
+
+        self._frame_id += 1
+        shards = [([], []) for _ in range(self.workers)]
+        for track_id, crop in crops:
+            shards[track_id % self.workers][0].append((track_id, crop))
+        for track_id in expired:
+            shards[track_id % self.workers][1].append(track_id)
+
+        pending = 0
+        for tasks, (shard_crops, shard_expired) in zip(self._tasks, shards):
+            if shard_crops or shard_expired:
+                tasks.put((self._frame_id, shard_crops, shard_expired))
+                pending += 1
+
+        results = {}
+        while pending:
+            try:
+                frame_id, shard_results = self._results.get(timeout=1.0)
+            except queue.Empty:
+                # Упавший процесс не должен подвешивать цикл обработки
+                if not all(process.is_alive()
+                           for process in self._processes):
+                    raise RuntimeError('pose worker exited')
+                continue
+            if frame_id != self._frame_id:
+                continue
+            results.update(shard_results)
+            pending -= 1
+        return results
+
+    def close(self):
+        if self.workers == 0:
+            self._local.close()
+            return
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+
+
+class MultiPersonPose(object):
+    # Кропы людей от детектора -> пул Pose -> ориентиры в координатах кадра
+    def __init__(
+            self,
+            workers=2,
+            max_persons=8,
+            padding=0.1,
+            feature_window=128,
+            iou_threshold=0.3,
+            max_age=15,
+            loader=POSE_LOADER,
+            **pose_kwargs,
+    ):
+        self.max_persons = max_persons
+        self.padding = padding
+        self.feature_window = feature_window
+        self.tracker = PersonTracker(iou_threshold, max_age)
+        self.pool = PoseWorkerPool(workers, loader, **pose_kwargs)
+        self.feature_engines = {}
+
+    def process(self, image, boxes, timestamp):
+        # boxes: x1, y1, x2, y2 по убыванию уверенности
+        image_height, image_width = image.shape[:2]
+        boxes = [tuple(box) for box in boxes[:self.max_persons]]
+        track_ids = self.tracker.update(boxes)
+
+        crops = []
+        regions = []
+        for track_id, (x1, y1, x2, y2) in zip(track_ids, boxes):
+            # Запас по краям, чтобы кисти и стопы не обрезались
+            pad_x = int((x2 - x1) * self.padding)
+            pad_y = int((y2 - y1) * self.padding)
+            x1, y1 = max(x1 - pad_x, 0), max(y1 - pad_y, 0)
+            x2 = min(x2 + pad_x, image_width)
+            y2 = min(y2 + pad_y, image_height)
+            regions.append((x1, y1, x2, y2))
+            crops.append((track_id,
+                          cv.cvtColor(image[y1:y2, x1:x2], cv.COLOR_BGR2RGB)))
+
+        results = self.pool.process(crops, self.tracker.expired)
+        for track_id in self.tracker.expired:
+            self.feature_engines.pop(track_id, None)
+
+        persons = []
+        for track_id, box, (x1, y1, x2, y2) in zip(track_ids, boxes, regions):
+            landmark_array = results.get(track_id)
+            gait_features = None
+            if landmark_array is not None:
+                # Координаты кропа -> координаты всего кадра
+                landmark_array = scale_landmark_array(landmark_array, x2 - x1,
+                                                      y2 - y1)
+                landmark_array[:, :2] += (x1, y1)
+                if track_id not in self.feature_engines:
+                    self.feature_engines[track_id] = GaitFeatureEngine(
+                        window=self.feature_window)
+                gait_features = self.feature_engines[track_id].update(
+                    landmark_array, timestamp)
+            persons.append({
+                'track_id': track_id,
+                'box': box,
+                'landmarks': landmark_array,
+                'gait': gait_features,
+            })
+        return persons
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def resample(sequence, length):
+    # Линейная интерполяция (T, F) -> (length, F): у всех одна длина
+    sequence = np.asarray(sequence, np.float64)
+    if sequence.ndim == 1:
+        sequence = sequence[:, None]
+    positions = np.linspace(0, len(sequence) - 1, length)
+    left = np.floor(positions).astype(np.int64)
+    right = np.minimum(left + 1, len(sequence) - 1)
+    weight = (positions - left)[:, None]
+    return sequence[left] * (1.0 - weight) + sequence[right] * weight
+
+
+def z_normalize(sequences):
+    # Каждый признак каждой последовательности: среднее 0, отклонение 1
+    mean = sequences.mean(axis=-2, keepdims=True)
+    std = sequences.std(axis=-2, keepdims=True)
+    return (sequences - mean) / np.maximum(std, 1e-9)
+
+
+def envelope(sequences, band):
+    # Верхняя и нижняя огибающие (N, L, F) в окне +-band по времени
+    padded = np.pad(sequences, ((0, 0), (band, band), (0, 0)),
+                    mode='edge')
+    windows = sliding_window_view(padded, 2 * band + 1, axis=1)
+    return windows.max(axis=-1), windows.min(axis=-1)
+
+
+def lb_keogh(query, upper, lower):
+    # Нижняя граница DTW для всех кандидатов сразу: (L, F) против (N, L, F)
+    above = np.maximum(query[None] - upper, 0.0)
+    below = np.maximum(lower - query[None], 0.0)
+    return np.einsum('nlf,nlf->n', above, above) + np.einsum(
+        'nlf,nlf->n', below, below)
+
+
+def dtw_distances(query, candidates, band):
+    # DTW с полосой Сакоэ-Чибы: (L, F) против (N, L, F) -> (N, )
+    # Стоимость - квадрат евклидова расстояния между кадрами. Клетки одной
+    # антидиагонали независимы: цикл идет по 2L-1 диагоналям, а внутри
+    # считаются все кандидаты и все клетки диагонали одной операцией
+    n, length = len(candidates), len(query)
+    cost = (np.einsum('lf,lf->l', query, query)[None, :, None] -
+            2.0 * np.einsum('lf,nmf->nlm', query, candidates) +
+            np.einsum('nmf,nmf->nm', candidates, candidates)[:, None, :])
+    np.maximum(cost, 0.0, out=cost)
+
+    total = np.full((n, length + 1, length + 1), np.inf)
+    total[:, 0, 0] = 0.0
+    for diagonal in range(2, 2 * length + 1):
+        i = np.arange(max(1, diagonal - length), min(length, diagonal - 1) + 1)
+        j = diagonal - i
+        inside = np.abs(i - j) <= band
+        i, j = i[inside], j[inside]
+        if len(i) == 0:
+            continue
+        best = np.minimum(np.minimum(total[:, i - 1, j - 1],
+                                     total[:, i - 1, j]), total[:, i, j - 1])
+        total[:, i, j] = cost[:, i - 1, j - 1] + best
+    return total[:, length, length]
+
+
+class GaitSequenceMatcher(object):
+    # Галерея последовательностей признаков походки (например,
+    # GaitFeatureEngine.window_array()) и поиск ближайших по DTW.
+    # Все последовательности приводятся к длине length; огибающие галереи
+    # считаются при записи, поэтому поиск сначала отсекает кандидатов по
+    # LB_Keogh и считает полный DTW только для оставшихся
+    def __init__(self, length=64, band=0.1, normalize=True, block_size=256):
+        self._length = length
+        self._band = max(int(round(band * length)), 0)
+        self._normalize = normalize
+        self._block_size = block_size
+        self._sequences = None
+        self._upper = None
+        self._lower = None
+        self._labels = np.empty(0, np.int64)
+        # Статистика последнего поиска
+        self.pruned = 0
+        self.computed = 0
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _prepare(self, sequences):
+        prepared = np.stack([resample(s, self._length) for s in sequences])
+        if self._normalize:
+            prepared = z_normalize(prepared)
+        return prepared
+
+    def enroll(self, person_ids, sequences):
+        person_ids = np.atleast_1d(np.asarray(person_ids, np.int64))
+        prepared = self._prepare(sequences)
+        upper, lower = envelope(prepared, self._band)
+        if self._sequences is None:
+            self._sequences, self._upper, self._lower = prepared, upper, lower
+        else:
+            self._sequences = np.concatenate((self._sequences, prepared))
+            self._upper = np.concatenate((self._upper, upper))
+            self._lower = np.concatenate((self._lower, lower))
+        self._labels = np.concatenate((self._labels, person_ids))
+
+    def search(self, sequence, k=1):
+        # k ближайших: метки и DTW-расстояния по возрастанию
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, np.int64), np.empty(0)
+        query = self._prepare([sequence])[0]
+        bounds = lb_keogh(query, self._upper, self._lower)
+
+        # Кандидаты по возрастанию нижней границы; блок, у которого
+        # граница уже хуже k-го найденного расстояния, не считается
+        order = np.argsort(bounds, kind='stable')
+        best_rows = np.empty(0, np.int64)
+        best_distances = np.empty(0)
+        computed = 0
+        for start in range(0, len(order), self._block_size):
+            if (len(best_distances) == k
+                    and bounds[order[start]] >= best_distances[-1]):
+                break
+            rows = order[start:start + self._block_size]
+            if len(best_distances) == k:
+                rows = rows[bounds[rows] < best_distances[-1]]
+            distances = dtw_distances(query, self._sequences[rows],
+                                      self._band)
+            computed += len(rows)
+
+            rows = np.concatenate((best_rows, rows))
+            distances = np.concatenate((best_distances, distances))
+            top = np.argsort(distances, kind='stable')[:k]
+            best_rows, best_distances = rows[top], distances[top]
+
+        self.computed = computed
+        self.pruned = len(self) - computed
+        return self._labels[best_rows], best_distances
+
+    def identify(self, sequence, threshold):
+        # Метка ближайшего соседа или -1, если дальше порога
+        labels, distances = self.search(sequence, k=1)
+        if len(labels) == 0 or distances[0] > threshold:
+            return -1
+        return int(labels[0])
+
+    def save(self, path):
+        sequences = self._sequences
+        if sequences is None:
+            sequences = np.empty((0, self._length, 0))
+        np.savez(path,
+                 sequences=sequences,
+                 labels=self._labels,
+                 length=self._length,
+                 band=self._band,
+                 normalize=self._normalize)
+
+    @classmethod
+    def load(cls, path, block_size=256):
+        with np.load(path) as data:
+            matcher = cls(int(data['length']), 0.0, bool(data['normalize']),
+                          block_size)
+            matcher._band = int(data['band'])
+            if len(data['labels']) > 0:
+                matcher._sequences = data['sequences']
+                matcher._upper, matcher._lower = envelope(
+                    matcher._sequences, matcher._band)
+                matcher._labels = data['labels']
+        return matcher
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        # Существующая галерея с диска или новая пустая
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls(**kwargs)
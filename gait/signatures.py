@@ -0,0 +1,203 @@
+import os
+import json
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class GaitSignatureIndex(object):
+    def __init__(self, path, dim, capacity=1024, block_size=65536):
+        self._path = path
+        self._block_size = block_size
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta['dim'] != dim:
+                raise ValueError('index dim {} != {}'.format(meta['dim'], dim))
+            self._dim = meta['dim']
+            self._count = meta['count']
+            self._capacity = meta['capacity']
+            mode = 'r+'
+        else:
+            self._dim = dim
+            self._count = 0
+            self._capacity = capacity
+            mode = 'w+'
+
+        # Галерея на диске: векторы, их квадраты норм и метки людей
+        self._vectors = self._open('vectors.npy', mode, (self._dim, ),
+                                   np.float32)
+        self._norms = self._open('norms.npy', mode, (), np.float32)
+        self._labels = self._open('labels.npy', mode, (), np.int64)
+
+        # Необязательная грубая разбивка на корзины (IVF)
+        self._centroids = None
+        self._assignments = None
+        if os.path.exists(os.path.join(path, 'centroids.npy')):
+            self._centroids = np.load(os.path.join(path, 'centroids.npy'))
+            self._assignments = self._open('assignments.npy', 'r+', (),
+                                           np.int32)
+        self._save_meta()
+
+    def __len__(self):
+        return self._count
+
+    def _open(self, name, mode, shape, dtype, capacity=None):
+        capacity = self._capacity if capacity is None else capacity
+        return open_memmap(os.path.join(self._path, name),
+                           mode=mode,
+                           dtype=dtype,
+                           shape=(capacity, ) + shape if mode == 'w+' else None)
+
+    def _save_meta(self):
+        with open(os.path.join(self._path, 'meta.json'), 'w') as f:
+            json.dump(
+                {
+                    'dim': self._dim,
+                    'count': self._count,
+                    'capacity': self._capacity,
+                }, f)
+
+    def _grow(self, min_capacity):
+        capacity = self._capacity
+        while capacity < min_capacity:
+            capacity *= 2
+
+        arrays = [('vectors.npy', '_vectors', (self._dim, ), np.float32),
+                  ('norms.npy', '_norms', (), np.float32),
+                  ('labels.npy', '_labels', (), np.int64)]
+        if self._assignments is not None:
+            arrays.append(('assignments.npy', '_assignments', (), np.int32))
+
+        for name, attr, shape, dtype in arrays:
+            old = getattr(self, attr)
+            tmp_name = name + '.tmp'
+            new = self._open(tmp_name, 'w+', shape, dtype, capacity=capacity)
+            new[:self._count] = old[:self._count]
+            new.flush()
+            del new, old
+            setattr(self, attr, None)
+            os.replace(os.path.join(self._path, tmp_name),
+                       os.path.join(self._path, name))
+            setattr(self, attr, self._open(name, 'r+', shape, dtype))
+
+        self._capacity = capacity
+
+    def enroll(self, person_ids, embeddings):
+        embeddings = np.atleast_2d(np.asarray(embeddings, np.float32))
+        person_ids = np.atleast_1d(np.asarray(person_ids, np.int64))
+        n = len(embeddings)
+        if self._count + n > self._capacity:
+            self._grow(self._count + n)
+
+        start, end = self._count, self._count + n
+        self._vectors[start:end] = embeddings
+        self._norms[start:end] = np.einsum('ij,ij->i', embeddings, embeddings)
+        self._labels[start:end] = person_ids
+        if self._assignments is not None:
+            self._assignments[start:end] = self._nearest_centroids(
+                embeddings, 1)[:, 0]
+        self._count = end
+        self.flush()
+
+    def flush(self):
+        self._vectors.flush()
+        self._norms.flush()
+        self._labels.flush()
+        if self._assignments is not None:
+            self._assignments.flush()
+        self._save_meta()
+
+    def build_buckets(self, n_buckets=256, n_iter=10, sample_size=50000):
+        # Грубый k-means на выборке галереи, затем разметка всех векторов
+        if self._count == 0:
+            return
+        rng = np.random.default_rng(0)
+        sample_index = rng.choice(self._count,
+                                  min(sample_size, self._count),
+                                  replace=False)
+        sample = np.asarray(self._vectors[np.sort(sample_index)])
+        n_buckets = min(n_buckets, len(sample))
+        centroids = sample[rng.choice(len(sample), n_buckets, replace=False)]
+        for _ in range(n_iter):
+            assignment = _pairwise_sq_distances(
+                sample, centroids).argmin(axis=1)
+            counts = np.bincount(assignment, minlength=n_buckets)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self._centroids = centroids.astype(np.float32)
+        np.save(os.path.join(self._path, 'centroids.npy'), self._centroids)
+        self._assignments = self._open('assignments.npy', 'w+', (), np.int32)
+        for start in range(0, self._count, self._block_size):
+            end = min(start + self._block_size, self._count)
+            self._assignments[start:end] = self._nearest_centroids(
+                self._vectors[start:end], 1)[:, 0]
+        self.flush()
+
+    def _nearest_centroids(self, embeddings, n_probe):
+        distances = _pairwise_sq_distances(embeddings, self._centroids)
+        n_probe = min(n_probe, len(self._centroids))
+        return np.argsort(distances, axis=1)[:, :n_probe]
+
+    def search(self, queries, k=5, n_probe=None):
+        # Пакетный поиск k ближайших: (Q, k) меток и квадратов расстояний
+        queries = np.atleast_2d(np.asarray(queries, np.float32))
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+
+        candidates = None
+        if n_probe is not None and self._centroids is not None:
+            buckets = np.unique(self._nearest_centroids(queries, n_probe))
+            candidates = np.flatnonzero(
+                np.isin(self._assignments[:self._count], buckets))
+
+        best_distances = np.full((len(queries), k), np.inf, np.float32)
+        best_rows = np.full((len(queries), k), -1, np.int64)
+        total = self._count if candidates is None else len(candidates)
+        for start in range(0, total, self._block_size):
+            end = min(start + self._block_size, total)
+            if candidates is None:
+                rows = np.arange(start, end)
+                vectors = self._vectors[start:end]
+                norms = self._norms[start:end]
+            else:
+                rows = candidates[start:end]
+                vectors = self._vectors[rows]
+                norms = self._norms[rows]
+
+            distances = (query_norms[:, None] - 2.0 * queries @ vectors.T +
+                         norms[None, :])
+
+            # Слияние с лучшими из предыдущих блоков
+            merged_distances = np.concatenate((best_distances, distances),
+                                              axis=1)
+            merged_rows = np.concatenate(
+                (best_rows, np.broadcast_to(rows, distances.shape)), axis=1)
+            top = np.argpartition(merged_distances, k - 1, axis=1)[:, :k]
+            best_distances = np.take_along_axis(merged_distances, top, axis=1)
+            best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+        order = np.argsort(best_distances, axis=1)
+        best_distances = np.maximum(
+            np.take_along_axis(best_distances, order, axis=1), 0.0)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        labels = np.where(best_rows >= 0,
+                          self._labels[np.maximum(best_rows, 0)], -1)
+        return labels, best_distances
+
+    def identify(self, queries, threshold, n_probe=None):
+        # Метка ближайшего соседа или -1, если дальше порога
+        labels, distances = self.search(queries, k=1, n_probe=n_probe)
+        return np.where(distances[:, 0] <= threshold, labels[:, 0], -1)
+
+
+def _pairwise_sq_distances(a, b):
+    a = np.asarray(a, np.float32)
+    b = np.asarray(b, np.float32)
+    return (np.einsum('ij,ij->i', a, a)[:, None] - 2.0 * a @ b.T +
+            np.einsum('ij,ij->i', b, b)[None, :])
@@ -0,0 +1,6 @@
+from .cvfpscalc import CvFpsCalc
+from .capture import LatestFrameCapture
+from .stats import Metrics, metrics
+from .motion import MotionGate
+from .frame_bus import FrameBusWriter, FrameBusReader, frame_valid, open_capture
+from .result_cache import ResultCache
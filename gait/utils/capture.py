@@ -0,0 +1,56 @@
+import threading
+
+
+class LatestFrameCapture(object):
+    def __init__(self, cap):
+        self._cap = cap
+        self._cond = threading.Condition()
+        self._frame = None
+        self._stopped = False
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._update, daemon=True)
+        self._thread.start()
+
+    def _update(self):
+        while True:
+            ret, frame = self._cap.read()
+            with self._cond:
+                if self._stopped:
+                    break
+                if not ret:
+                    self._stopped = True
+                    self._cond.notify_all()
+                    break
+                # Слот на один кадр: непрочитанный кадр вытесняется новым
+                if self._frame is not None:
+                    self._dropped += 1
+                self._frame = frame
+                self._cond.notify_all()
+
+    def read(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._frame is not None or self._stopped, timeout)
+            frame = self._frame
+            self._frame = None
+        return frame is not None, frame
+
+    def get_dropped(self):
+        with self._cond:
+            return self._dropped
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def set(self, prop_id, value):
+        return self._cap.set(prop_id, value)
+
+    def get(self, prop_id):
+        return self._cap.get(prop_id)
+
+    def release(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        self._cap.release()
@@ -3,10 +3,11 @@ import cv2 as cv
 
 
 class CvFpsCalc(object):
-    def __init__(self, buffer_len=1):
+    def __init__(self, buffer_len=1, histogram=None):
         self._start_tick = cv.getTickCount()
         self._freq = 1000.0 / cv.getTickFrequency()
         self._difftimes = deque(maxlen=buffer_len)
+        self._histogram = histogram
 
     def get(self):
         current_tick = cv.getTickCount()
@@ -14,6 +15,8 @@ class CvFpsCalc(object):
         self._start_tick = current_tick
 
         self._difftimes.append(different_time)
+        if self._histogram is not None:
+            self._histogram.observe(different_time / 1000.0)
 
         fps = 1000.0 / (sum(self._difftimes) / len(self._difftimes))
         fps_rounded = round(fps, 2)
@@ -0,0 +1,236 @@
+import sys
+import time
+import cv2 as cv
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Заголовок: [высота, ширина, каналы, слоты, последний seq, закрыт,
+# интервал между кадрами в нс]
+_HEADER = 7
+_LATEST = 4
+_CLOSED = 5
+_INTERVAL = 6
+
+
+def _layout(shape, slots):
+    # Заголовок, номера кадров в слотах, затем сами кадры
+    seq_offset = _HEADER * 8
+    frame_offset = seq_offset + slots * 8
+    return seq_offset, frame_offset, frame_offset + slots * int(
+        np.prod(shape))
+
+
+class _Ring(object):
+    def __init__(self, shm, shape, slots):
+        seq_offset, frame_offset, _ = _layout(shape, slots)
+        self.shm = shm
+        self.shape = shape
+        self.slots = slots
+        self.header = np.ndarray((_HEADER, ), np.int64, shm.buf)
+        self.seqs = np.ndarray((slots, ), np.int64, shm.buf, seq_offset)
+        self.frames = np.ndarray((slots, ) + shape, np.uint8, shm.buf,
+                                 frame_offset)
+
+    def close(self):
+        # Представления держат буфер: без них shm.close() упадет
+        del self.header, self.seqs, self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            # Кадр, отданный read(), еще жив: отображение закроется при выходе
+            pass
+
+
+class FrameBusWriter(object):
+    # Кольцо кадров в общей памяти. Пишет один процесс захвата, номер
+    # кадра (seq) растет на 1. Слот сначала помечается -1, затем кадр
+    # копируется, затем слоту и заголовку ставится seq: читатель никогда
+    # не примет недописанный кадр
+    def __init__(self, name, shape, slots=4):
+        shape = tuple(shape)
+        if len(shape) == 2:
+            shape += (1, )
+        self.shm = shared_memory.SharedMemory(name=name,
+                                              create=True,
+                                              size=_layout(shape, slots)[2])
+        self.ring = _Ring(self.shm, shape, slots)
+        self.ring.header[:] = shape + (slots, -1, 0, 0)
+        self.ring.seqs[:] = -1
+        self.seq = -1
+        self._last_commit = None
+        self._interval = 0.0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def begin(self):
+        # Слот для следующего кадра: в него можно декодировать напрямую
+        slot = (self.seq + 1) % self.ring.slots
+        self.ring.seqs[slot] = -1
+        return self.ring.frames[slot]
+
+    def commit(self):
+        # Интервал между кадрами (скользящее среднее): по нему читатели
+        # оценивают, за сколько писатель обходит кольцо
+        now = time.perf_counter()
+        if self._last_commit is not None:
+            interval = now - self._last_commit
+            self._interval = (interval if self._interval == 0.0 else
+                              0.9 * self._interval + 0.1 * interval)
+            self.ring.header[_INTERVAL] = int(self._interval * 1e9)
+        self._last_commit = now
+        self.seq += 1
+        self.ring.seqs[self.seq % self.ring.slots] = self.seq
+        self.ring.header[_LATEST] = self.seq
+        return self.seq
+
+    def write(self, frame):
+        np.copyto(self.begin(), frame.reshape(self.ring.shape))
+        return self.commit()
+
+    def close(self):
+        self.ring.header[_CLOSED] = 1
+        self.ring.close()
+        self.shm.unlink()
+
+
+class FrameBusReader(object):
+    # Читатель с интерфейсом VideoCapture: read() отдает представление
+    # NumPy последнего кадра прямо в общей памяти, без копирования.
+    # Кадр действителен, пока писатель не обойдет кольцо. copy='auto':
+    # если читатель держит кадр дольше половины обхода кольца (время между
+    # вызовами read()), кадр копируется в свой буфер. valid() после
+    # обработки проверяет, что кадр не был перезаписан
+    def __init__(self, name, timeout=5.0, poll_interval=0.001, copy='auto'):
+        self.poll_interval = poll_interval
+        self.copy = copy
+        self.shm = _attach(name, timeout)
+        header = np.ndarray((_HEADER, ), np.int64, self.shm.buf)
+        shape = tuple(int(v) for v in header[:3])
+        slots = int(header[3])
+        del header
+        self.ring = _Ring(self.shm, shape, slots)
+        # Кадр видят все читатели: рисовать можно только на копии
+        self.ring.frames.flags.writeable = False
+        self.seq = -1
+        self.dropped = 0
+        self.copied = False
+        self._buffer = None
+        self._hold = None
+        self._returned = None
+
+    def _track_hold(self):
+        # Сколько читатель держал прошлый кадр: рост сразу, спад плавно
+        if self._returned is None:
+            return
+        hold = time.perf_counter() - self._returned
+        if self._hold is None or hold > self._hold:
+            self._hold = hold
+        else:
+            self._hold = 0.9 * self._hold + 0.1 * hold
+
+    def _should_copy(self):
+        if self.copy != 'auto':
+            return bool(self.copy)
+        interval = self.ring.header[_INTERVAL] / 1e9
+        if self._hold is None or interval <= 0:
+            return True
+        return self._hold > 0.5 * interval * self.ring.slots
+
+    def read(self, timeout=None):
+        self._track_hold()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            latest = int(self.ring.header[_LATEST])
+            if latest > self.seq:
+                slot = latest % self.ring.slots
+                frame = self.ring.frames[slot]
+                if self.ring.seqs[slot] != latest:
+                    # Писатель уже занял слот: берем следующий номер
+                    continue
+                self.copied = self._should_copy()
+                if self.copied:
+                    if self._buffer is None:
+                        self._buffer = np.empty_like(frame)
+                    np.copyto(self._buffer, frame)
+                    if self.ring.seqs[slot] != latest:
+                        # Слот перезаписан во время копирования
+                        continue
+                    frame = self._buffer
+                if self.seq >= 0:
+                    self.dropped += latest - self.seq - 1
+                self.seq = latest
+                if frame.shape[2] == 1:
+                    frame = frame[:, :, 0]
+                self._returned = time.perf_counter()
+                return True, frame
+            if self.ring.header[_CLOSED]:
+                return False, None
+            if deadline is not None and time.perf_counter() > deadline:
+                return False, None
+            time.sleep(self.poll_interval)
+
+    def valid(self, seq=None):
+        # Без seq - последний кадр read(); копия в своем буфере всегда цела
+        if seq is None:
+            if self.copied:
+                return True
+            seq = self.seq
+        return self.ring.seqs[seq % self.ring.slots] == seq
+
+    def get_dropped(self):
+        return self.dropped
+
+    def isOpened(self):
+        return not self.ring.header[_CLOSED]
+
+    def set(self, prop_id, value):
+        # Размер и FPS задает процесс захвата
+        return False
+
+    def get(self, prop_id):
+        if prop_id == cv.CAP_PROP_FRAME_WIDTH:
+            return float(self.ring.shape[1])
+        if prop_id == cv.CAP_PROP_FRAME_HEIGHT:
+            return float(self.ring.shape[0])
+        return 0.0
+
+    def release(self):
+        if self.shm is not None:
+            self.ring.close()
+            self.shm = None
+
+
+def _attach(name, timeout):
+    # Процесс захвата может стартовать позже читателя
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            return _open(name)
+        except FileNotFoundError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _open(name):
+    # Память принадлежит процессу захвата: resource_tracker читателя
+    # не должен удалять ее при выходе
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def frame_valid(cap):
+    # Для обычных источников кадр всегда свой
+    return not isinstance(cap, FrameBusReader) or cap.valid()
+
+
+def open_capture(source, copy='auto'):
+    # 'bus:имя' - кадры из общей памяти, иначе номер камеры или путь
+    if isinstance(source, str) and source.startswith('bus:'):
+        return FrameBusReader(source[4:], copy=copy)
+    return cv.VideoCapture(source)
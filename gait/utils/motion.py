@@ -0,0 +1,49 @@
+import cv2 as cv
+import numpy as np
+
+
+class MotionGate(object):
+    # Уменьшенный серый кадр сравнивается с фоном (скользящее среднее).
+    # update() -> True, если модели нужно запускать: есть движение или
+    # пропущено max_skip кадров подряд
+    def __init__(self, size=(80, 60), pixel_threshold=25, min_changed=0.002,
+                 learning_rate=0.05, max_skip=30):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.max_skip = max_skip
+
+        # Буферы создаются один раз: на кадр ничего не выделяется
+        self._small = np.empty((size[1], size[0], 3), np.uint8)
+        self._gray = np.empty((size[1], size[0]), np.uint8)
+        self._background = None
+        self._background_u8 = np.empty_like(self._gray)
+        self._diff = np.empty_like(self._gray)
+        self._skipped = 0
+        self.skipped_total = 0
+
+    def update(self, frame):
+        cv.resize(frame, self.size, dst=self._small,
+                  interpolation=cv.INTER_AREA)
+        cv.cvtColor(self._small, cv.COLOR_BGR2GRAY, dst=self._gray)
+        cv.GaussianBlur(self._gray, (5, 5), 0, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            return True
+
+        cv.convertScaleAbs(self._background, dst=self._background_u8)
+        cv.absdiff(self._gray, self._background_u8, dst=self._diff)
+        cv.threshold(self._diff, self.pixel_threshold, 255, cv.THRESH_BINARY,
+                     dst=self._diff)
+        changed = cv.countNonZero(self._diff) / self._diff.size
+        cv.accumulateWeighted(self._gray, self._background,
+                              self.learning_rate)
+
+        if changed >= self.min_changed or self._skipped >= self.max_skip:
+            self._skipped = 0
+            return True
+        self._skipped += 1
+        self.skipped_total += 1
+        return False
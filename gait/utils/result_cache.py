@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+import cv2 as cv
+import numpy as np
+
+_MISS = object()
+
+
+def thumbnail(crop, size=8):
+    # Уменьшенный серый кроп без средней яркости: дешевый отпечаток лица,
+    # устойчивый к шуму и небольшим изменениям освещения
+    small = cv.resize(crop, (size, size), interpolation=cv.INTER_AREA)
+    if small.ndim == 3:
+        small = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+    small = small.astype(np.float32)
+    return small - small.mean()
+
+
+class ResultCache(object):
+    # Кэш результатов классификатора лиц. Ключ - уменьшенный кроп и
+    # положение рамки: лицо считается тем же, если центр и ширина сдвинулись
+    # не больше чем на max_shift ширины рамки, а кропы отличаются в среднем
+    # не больше чем на max_distance уровней яркости. Не больше max_size
+    # записей (LRU), запись старше ttl секунд не отдается
+    def __init__(self, max_size=256, ttl=2.0, max_distance=6.0,
+                 max_shift=0.25, thumbnail_size=8, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_shift = max_shift
+        self.thumbnail_size = thumbnail_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, image, box):
+        x1, y1, x2, y2 = [int(v) for v in box]
+        crop = image[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)]
+        if crop.size == 0:
+            return None
+        return (thumbnail(crop, self.thumbnail_size), (x1 + x2) / 2.0,
+                (y1 + y2) / 2.0, max(x2 - x1, 1))
+
+    def _find(self, key):
+        thumb, cx, cy, width = key
+        limit = self.max_shift * width
+        now = self.clock()
+        best_id, best_distance, expired = None, self.max_distance, []
+        for entry_id, (entry_key, _, stamp) in self._entries.items():
+            if now - stamp > self.ttl:
+                expired.append(entry_id)
+                continue
+            entry_thumb, entry_cx, entry_cy, entry_width = entry_key
+            # Сначала дешевая проверка положения, потом сравнение кропов
+            if (abs(entry_cx - cx) > limit or abs(entry_cy - cy) > limit
+                    or abs(entry_width - width) > limit):
+                continue
+            distance = float(np.abs(entry_thumb - thumb).mean())
+            if distance <= best_distance:
+                best_id, best_distance = entry_id, distance
+        for entry_id in expired:
+            del self._entries[entry_id]
+        return best_id
+
+    def get(self, key):
+        entry_id = None if key is None else self._find(key)
+        if entry_id is None:
+            self.misses += 1
+            return _MISS
+        self.hits += 1
+        # Попадание продлевает жизнь в LRU, но не TTL: результат устаревает
+        self._entries.move_to_end(entry_id)
+        return self._entries[entry_id][1]
+
+    def put(self, key, value):
+        if key is None:
+            return
+        self._entries[self._next_id] = (key, value, self.clock())
+        self._next_id += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def map(self, image, boxes, compute):
+        # boxes: (x1, y1, x2, y2); compute(indices) считает одним батчем
+        # результаты только для лиц, которых нет в кэше
+        boxes = np.asarray(boxes).reshape(-1, 4).tolist()
+        keys = [self.key(image, box) for box in boxes]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is _MISS]
+        if missing:
+            for i, value in zip(missing, compute(missing)):
+                results[i] = value
+                self.put(keys[i], value)
+        return results
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограммы задержек, мс
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000,
+              2500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram(object):
+    # Фиксированные корзины: observe только увеличивает счетчики
+    def __init__(self, bounds_ms=BUCKETS_MS):
+        self.bounds = tuple(bound / 1000.0 for bound in bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Линейная интерполяция внутри корзины
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+    def summary(self):
+        result = {'count': self.count}
+        if self.count:
+            result['mean_ms'] = self.total / self.count * 1000.0
+            for q in QUANTILES:
+                result['p{}_ms'.format(int(q * 100))] = (self.quantile(q) *
+                                                         1000.0)
+            result['max_ms'] = self.max * 1000.0
+        return result
+
+
+class StageTimer(object):
+    # Один объект на стадию:
+    #   with metrics.timer('pose'): ...
+    #   @metrics.timer('pose')
+    # Время начала - в стеке своего потока: стадию можно вкладывать
+    # и замерять из нескольких потоков одновременно
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = getattr(self._local, 'starts', None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self._local.starts.pop())
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.histogram.observe(time.perf_counter() - start)
+
+        return wrapper
+
+
+class Metrics(object):
+    def __init__(self, prefix='iubip'):
+        self.prefix = prefix
+        self._histograms = {}
+        self._timers = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._server = None
+
+    def histogram(self, name):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = LatencyHistogram()
+            return self._histograms[name]
+
+    def timer(self, name):
+        if name not in self._timers:
+            self._timers[name] = StageTimer(self.histogram(name))
+        return self._timers[name]
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name, value):
+        # Датчик: размер очереди, число лиц и т.п.
+        self._gauges[name] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'time': time.time(),
+                'stages': {
+                    name: histogram.summary()
+                    for name, histogram in self._histograms.items()
+                },
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+            }
+
+    def to_prometheus(self):
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            histograms = [(name, histogram.bounds, list(histogram.counts),
+                           histogram.total, histogram)
+                          for name, histogram in self._histograms.items()]
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines.append('# TYPE {}_stage_seconds histogram'.format(prefix))
+        for name, bounds, counts, total, _ in histograms:
+            cumulative = 0
+            for bound, n in zip(bounds + (float('inf'), ), counts):
+                cumulative += n
+                lines.append('{}_stage_seconds_bucket{{stage="{}",le="{}"}} {}'
+                             .format(prefix, name,
+                                     '+Inf' if bound == float('inf') else
+                                     repr(bound), cumulative))
+            lines.append('{}_stage_seconds_sum{{stage="{}"}} {!r}'.format(
+                prefix, name, total))
+            lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(
+                prefix, name, cumulative))
+        lines.append('# TYPE {}_stage_quantile_seconds gauge'.format(prefix))
+        for name, _, _, _, histogram in histograms:
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                if value is not None:
+                    lines.append(
+                        '{}_stage_quantile_seconds{{stage="{}",quantile="{}"}} '
+                        '{!r}'.format(prefix, name, q, value))
+        for name, value in sorted(counters.items()):
+            lines.append('# TYPE {}_{}_total counter'.format(prefix, name))
+            lines.append('{}_{}_total {}'.format(prefix, name, value))
+        for name, value in sorted(gauges.items()):
+            lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+            lines.append('{}_{} {}'.format(prefix, name, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # Атомарная замена: читатель не увидит половину файла
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_export(self, stats_file=None, interval=5.0, port=None,
+                     host='127.0.0.1'):
+        if stats_file is not None:
+            thread = threading.Thread(target=self._flush_loop,
+                                      args=(stats_file, interval),
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if port is not None:
+            self._server = ThreadingHTTPServer((host, port),
+                                               _make_handler(self))
+            self._server.daemon_threads = True
+            thread = threading.Thread(target=self._server.serve_forever,
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _flush_loop(self, stats_file, interval):
+        while not self._stop.wait(interval):
+            self.write(stats_file)
+        self.write(stats_file)
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+
+def _make_handler(metrics):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+metrics = Metrics()
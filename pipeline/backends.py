@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import cv2 as cv
+
+# Имя -> (бэкенд, цель) cv.dnn. Варианты с fp16 считают в половинной точности.
+# Константы берутся по имени: в старых сборках OpenCV части из них нет.
+BACKENDS = {
+    'opencv-cpu': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_CPU'),
+    'opencv-cpu-fp16': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_CPU_FP16'),
+    'opencl': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL'),
+    'opencl-fp16': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL_FP16'),
+    'openvino': ('DNN_BACKEND_INFERENCE_ENGINE', 'DNN_TARGET_CPU'),
+    'cuda': ('DNN_BACKEND_CUDA', 'DNN_TARGET_CUDA'),
+    'cuda-fp16': ('DNN_BACKEND_CUDA', 'DNN_TARGET_CUDA_FP16'),
+}
+DEFAULT_BACKEND = 'opencv-cpu'
+
+# Например: IUBIP_DNN_BACKEND=cuda или IUBIP_DNN_BACKEND=yolo=cuda,face_ssd=opencl
+ENV_VAR = 'IUBIP_DNN_BACKEND'
+
+_selected = {}
+
+
+def _constants(name):
+    backend_name, target_name = BACKENDS[name]
+    return getattr(cv.dnn, backend_name, None), getattr(cv.dnn, target_name,
+                                                        None)
+
+
+def available():
+    names = []
+    for name in BACKENDS:
+        backend, target = _constants(name)
+        if backend is None or target is None:
+            continue
+        try:
+            targets = cv.dnn.getAvailableTargets(backend)
+        except cv.error:
+            continue
+        if target in targets:
+            names.append(name)
+    return names
+
+
+def _from_env(model):
+    value = os.environ.get(ENV_VAR, '')
+    for item in value.split(','):
+        if '=' in item:
+            item_model, backend = item.split('=', 1)
+            if item_model.strip() == model:
+                return backend.strip()
+        elif item.strip():
+            return item.strip()
+    return None
+
+
+def select(model, backend):
+    if backend not in BACKENDS:
+        raise ValueError('unknown dnn backend: ' + backend)
+    _selected[model] = backend
+
+
+def selected(model):
+    return _selected.get(model) or _from_env(model) or DEFAULT_BACKEND
+
+
+def apply(net, model):
+    # Загрузчики моделей вызывают это сразу после readNet
+    backend, target = _constants(selected(model))
+    if backend is None or target is None:
+        backend, target = _constants(DEFAULT_BACKEND)
+    net.setPreferableBackend(backend)
+    net.setPreferableTarget(target)
+    return net
+
+
+def probe(model, candidates=None, runs=5, **kwargs):
+    # Несколько forward на каждом кандидате, выбирается самый быстрый.
+    # kwargs - параметры загрузчика (например, variant): замеряется та же
+    # сеть, что потом загрузит модуль
+    from pipeline.models import registry
+
+    loader, warmup = registry.functions(model)
+    timings = {}
+    for name in candidates or available():
+        select(model, name)
+        try:
+            net = loader(**kwargs)
+            # Первый прогон - инициализация бэкенда, в замер не входит
+            warmup(net)
+            start = time.perf_counter()
+            for _ in range(runs):
+                warmup(net)
+            timings[name] = (time.perf_counter() - start) / runs
+        except cv.error:
+            continue
+
+    best = min(timings, key=timings.get) if timings else DEFAULT_BACKEND
+    select(model, best)
+    return best, timings
+
+
+def setup(models, backend, options=None):
+    # --dnn_backend: имя бэкенда для всех моделей или 'auto' (замер);
+    # options: {модель: параметры загрузчика} для замера нужного варианта
+    if backend is None:
+        return
+    for model in models:
+        if backend != 'auto':
+            select(model, backend)
+            continue
+        best, timings = probe(model, **(options or {}).get(model, {}))
+        print('{}: {} ({})'.format(
+            model, best, ', '.join('{} {:.1f}ms'.format(name, value * 1000)
+                                   for name, value in sorted(
+                                       timings.items(),
+                                       key=lambda item: item[1]))))
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import contextlib
+import cv2 as cv
+import numpy as np
+
+from pipeline.models import registry
+
+STAGES = ('detector', 'emotion', 'face_age', 'gait')
+PHASES = ('capture', 'preprocess', 'forward', 'postprocess', 'render')
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--stages", nargs='*', choices=STAGES,
+                        default=list(STAGES))
+    parser.add_argument("--input",
+                        help='recorded clip; synthetic frames if omitted',
+                        type=str,
+                        default=None)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup_frames", type=int, default=5)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare",
+                        help='previous results to compare against',
+                        type=str,
+                        default=None)
+    parser.add_argument("--tolerance",
+                        help='allowed relative p50 slowdown per phase',
+                        type=float,
+                        default=0.1)
+
+    args = parser.parse_args()
+
+    return args
+
+
+class PhaseTimer(object):
+    def __init__(self, frames):
+        self.samples = {phase: np.zeros(frames) for phase in PHASES}
+        self.frame = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Фаза может встречаться в кадре несколько раз: время суммируется
+        start = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.samples[name][self.frame] += seconds
+
+    def summary(self, skip=0):
+        phases = {}
+        total = np.zeros(self.frame - skip)
+        for name in PHASES:
+            values = self.samples[name][skip:self.frame]
+            total += values
+            phases[name] = _stats(values)
+        return {'phases': phases, 'total': _stats(total)}
+
+
+def _stats(values):
+    if len(values) == 0:
+        return {'n': 0}
+    values_ms = values * 1000.0
+    p50, p95, p99 = np.percentile(values_ms, (50, 95, 99))
+    return {
+        'n': int(len(values_ms)),
+        'mean_ms': float(values_ms.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values_ms.max()),
+    }
+
+
+def synthetic_frames(width, height, count, seed=0):
+    # Детерминированные кадры: фон-шум и движущийся силуэт
+    rng = np.random.default_rng(seed)
+    background = cv.GaussianBlur(
+        rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+    for index in range(count):
+        frame = background.copy()
+        center_x = int((index * 7) % width)
+        cv.ellipse(frame, (center_x, height // 2),
+                   (width // 16, height // 3), 0, 0, 360, (60, 80, 120), -1)
+        cv.circle(frame, (center_x, height // 2 - height // 3),
+                  width // 24, (150, 170, 200), -1)
+        yield frame
+
+
+def video_frames(path, width, height, count):
+    cap = cv.VideoCapture(path)
+    for _ in range(count):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv.resize(frame, (width, height))
+        yield frame
+    cap.release()
+
+
+class DetectorStage(object):
+    models = (('yolo', {}), )
+
+    def __init__(self):
+        from detector.detector import ObjectDetector
+
+        self.detector = ObjectDetector()
+
+    def run(self, frame, timer):
+        from detector.detector import drawObjects
+
+        with timer.phase('preprocess'):
+            blob = self.detector.blob(frame)
+        with timer.phase('forward'):
+            outputs = self.detector.forward(blob)
+        with timer.phase('postprocess'):
+            result = self.detector.decode(outputs, frame.shape[1],
+                                          frame.shape[0])
+        with timer.phase('render'):
+            drawObjects(frame, *result)
+
+
+class FaceStage(object):
+    # Общая часть emotion и face_age: SSD-детектор лиц
+    def __init__(self):
+        from Face_age.face_detector import FaceDetector
+
+        self.face_detector = FaceDetector()
+
+    def detect_faces(self, frame, timer):
+        with timer.phase('preprocess'):
+            blob = self.face_detector.blob(frame)
+        with timer.phase('forward'):
+            detections = self.face_detector.forward(blob)
+        with timer.phase('postprocess'):
+            return self.face_detector.decode(detections, frame.shape[1],
+                                             frame.shape[0])
+
+
+class EmotionStage(FaceStage):
+    models = (('face_ssd', {}), ('emotion', {}))
+
+    def __init__(self):
+        from emotion.videoTester import EmotionClassifier
+
+        super(EmotionStage, self).__init__()
+        self.classifier = EmotionClassifier(registry.get('emotion'))
+
+    def run(self, frame, timer):
+        from emotion.videoTester import emotions
+        from Face_age.face_detector import toRects
+
+        face_boxes = self.detect_faces(frame, timer)
+        with timer.phase('preprocess'):
+            gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+            rects = toRects(face_boxes)
+            batch = self.classifier.prepare(gray, rects)
+        predictions = np.empty((0, len(emotions)))
+        if len(rects):
+            with timer.phase('forward'):
+                predictions = self.classifier.forward(batch)
+        with timer.phase('postprocess'):
+            labels = [emotions[i] for i in np.argmax(predictions, axis=1)]
+        with timer.phase('render'):
+            for (x, y, w, h), label in zip(rects.tolist(), labels):
+                cv.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                cv.putText(frame, label, (x, y), cv.FONT_HERSHEY_SIMPLEX, 1,
+                           (0, 0, 255), 2)
+
+
+class FaceAgeStage(FaceStage):
+    models = (('face_ssd', {}), ('age_gender', {}))
+
+    def __init__(self):
+        super(FaceAgeStage, self).__init__()
+        self.age_net, self.gender_net = registry.get('age_gender')
+
+    def run(self, frame, timer):
+        from Face_age.neyron import (ageGenderBlob, forwardAgeGender,
+                                     decodeAgeGender)
+        from Face_age.face_detector import drawFaceBoxes
+
+        face_boxes = self.detect_faces(frame, timer)
+        results = []
+        if len(face_boxes):
+            with timer.phase('preprocess'):
+                blob = ageGenderBlob(frame, face_boxes)
+            with timer.phase('forward'):
+                age_preds, gender_preds = forwardAgeGender(
+                    self.age_net, self.gender_net, blob)
+            with timer.phase('postprocess'):
+                results = decodeAgeGender(face_boxes, age_preds, gender_preds)
+        with timer.phase('render'):
+            drawFaceBoxes(frame, face_boxes)
+            for result in results:
+                cv.putText(frame, result['gender'] + ', ' + result['age'],
+                           (result['box'][0], result['box'][1] - 10),
+                           cv.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2,
+                           cv.LINE_AA)
+
+
+class GaitStage(object):
+    models = (('pose', {'model_complexity': 1}), )
+
+    def __init__(self):
+        from gait.features import GaitFeatureEngine
+
+        self.pose = registry.get('pose', model_complexity=1)
+        self.feature_engine = GaitFeatureEngine()
+        self.frame_index = 0
+
+    def run(self, frame, timer):
+        from gait.gait import (calc_landmark_array, scale_landmark_array,
+                               draw_landmarks, draw_stick_figure)
+
+        with timer.phase('preprocess'):
+            image = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        with timer.phase('forward'):
+            results = self.pose.process(image)
+        landmark_array = None
+        with timer.phase('postprocess'):
+            if results.pose_landmarks is not None:
+                landmark_array = scale_landmark_array(
+                    calc_landmark_array(results.pose_landmarks),
+                    frame.shape[1], frame.shape[0])
+                # Время по номеру кадра: результат не зависит от скорости
+                self.feature_engine.update(landmark_array,
+                                           self.frame_index / 30.0)
+        self.frame_index += 1
+        with timer.phase('render'):
+            if landmark_array is not None:
+                draw_landmarks(frame, landmark_array)
+                draw_stick_figure(np.zeros_like(frame), landmark_array)
+
+
+STAGE_CLASSES = {
+    'detector': DetectorStage,
+    'emotion': EmotionStage,
+    'face_age': FaceAgeStage,
+    'gait': GaitStage,
+}
+
+
+def run_stage(name, frames, count, warmup_frames):
+    stage_class = STAGE_CLASSES[name]
+    for model_name, kwargs in stage_class.models:
+        registry.warmup(model_name, **kwargs)
+    stage = stage_class()
+
+    timer = PhaseTimer(count)
+    frames = iter(frames)
+    start = time.perf_counter()
+    while True:
+        # Конец входа - не кадр: время последнего next() не записывается
+        capture_start = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        timer.add('capture', time.perf_counter() - capture_start)
+        stage.run(frame, timer)
+        timer.frame += 1
+    elapsed = time.perf_counter() - start
+
+    skip = min(warmup_frames, max(timer.frame - 1, 0))
+    result = timer.summary(skip=skip)
+    result['frames'] = timer.frame
+    result['fps'] = timer.frame / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+def compare(results, baseline, tolerance):
+    # Сравнение p50 по каждой фазе; True, если есть регрессия
+    regressed = False
+    for stage, stage_result in results['stages'].items():
+        if stage not in baseline.get('stages', {}):
+            continue
+        old_phases = baseline['stages'][stage]['phases']
+        for phase, stats in stage_result['phases'].items():
+            old = old_phases.get(phase, {})
+            if not stats.get('n') or not old.get('n'):
+                continue
+            ratio = stats['p50_ms'] / max(old['p50_ms'], 1e-6)
+            # Доли миллисекунды не считаем регрессией
+            slow = (ratio > 1.0 + tolerance
+                    and stats['p50_ms'] - old['p50_ms'] > 0.1)
+            regressed = regressed or slow
+            print('{:<10} {:<12} {:9.3f} -> {:9.3f} ms  x{:.2f}{}'.format(
+                stage, phase, old['p50_ms'], stats['p50_ms'], ratio,
+                '  REGRESSION' if slow else ''))
+    return regressed
+
+
+def main():
+    args = get_args()
+
+    results = {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(),
+            'source': args.input or 'synthetic',
+            'width': args.width,
+            'height': args.height,
+            'frames': args.frames,
+            'warmup_frames': args.warmup_frames,
+            'seed': args.seed,
+            'opencv': cv.__version__,
+            'numpy': np.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'stages': {},
+    }
+
+    for stage in args.stages:
+        if args.input is not None:
+            frames = video_frames(args.input, args.width, args.height,
+                                  args.frames)
+        else:
+            frames = synthetic_frames(args.width, args.height, args.frames,
+                                      args.seed)
+        results['stages'][stage] = run_stage(stage, frames, args.frames,
+                                             args.warmup_frames)
+    results['models'] = registry.timings()
+
+    text = json.dumps(results, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import math
+import argparse
+import cv2 as cv
+
+from gait.utils import FrameBusWriter, metrics
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--device", help='camera id or video path', type=str,
+                        default='0')
+    parser.add_argument("--width", help='cap width', type=int, default=640)
+    parser.add_argument("--height", help='cap height', type=int, default=360)
+    parser.add_argument("--bus", help='shared memory name', type=str,
+                        default='iubip')
+    parser.add_argument("--slots",
+                        help='frames in the ring (default: from --stage_latency)',
+                        type=int,
+                        default=None)
+    parser.add_argument("--stage_latency",
+                        help='slowest reader stage, ms per frame',
+                        type=float,
+                        default=500.0)
+    parser.add_argument('--stats_file', type=str, default=None)
+    parser.add_argument('--stats_interval', type=float, default=5.0)
+    parser.add_argument('--metrics_port', type=int, default=None)
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main():
+    args = get_args()
+
+    # Один процесс декодирует камеру, модули читают кадры через --frame_bus
+    device = int(args.device) if args.device.isdigit() else args.device
+    cap = cv.VideoCapture(device)
+    cap.set(cv.CAP_PROP_FRAME_WIDTH, args.width)
+    cap.set(cv.CAP_PROP_FRAME_HEIGHT, args.height)
+    ret, frame = cap.read()
+    if not ret:
+        raise SystemExit('cannot read from ' + args.device)
+
+    # Кольцо не должно обойтись, пока самый медленный модуль держит кадр:
+    # слотов на stage_latency при FPS камеры и запас
+    slots = args.slots
+    if slots is None:
+        fps = cap.get(cv.CAP_PROP_FPS) or 30.0
+        slots = max(4, int(math.ceil(args.stage_latency / 1000.0 * fps)) + 2)
+
+    # Размер кольца - по первому кадру: камера может не принять width/height
+    bus = FrameBusWriter(args.bus, frame.shape, slots)
+    bus.write(frame)
+    metrics.start_export(args.stats_file, args.stats_interval,
+                         args.metrics_port)
+    print('frame bus {}: {}x{}, {} slots'.format(args.bus, frame.shape[1],
+                                                 frame.shape[0], slots))
+
+    try:
+        while True:
+            # Декодирование сразу в слот общей памяти
+            slot = bus.begin()
+            with metrics.timer('capture'):
+                ret, frame = cap.read(slot)
+            if not ret:
+                break
+            if frame is not slot:
+                slot[...] = frame
+            bus.commit()
+            metrics.inc('frames')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.stop()
+        cap.release()
+        bus.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import time
+import importlib
+import threading
+
+# Имя модели -> (загрузчик, прогрев) в виде "модуль:функция".
+# Модули импортируются только при первом обращении к модели.
+MODELS = {
+    'yolo': ('detector.detector:loadNet', 'detector.detector:warmupNet'),
+    'face_ssd': ('Face_age.face_detector:loadFaceNet',
+                 'Face_age.face_detector:warmupFaceNet'),
+    'age_gender': ('Face_age.neyron:loadAgeGenderNets',
+                   'Face_age.neyron:warmupAgeGenderNets'),
+    'emotion': ('emotion.videoTester:load_model',
+                'emotion.videoTester:warmup_model'),
+    'pose': ('gait.gait:load_pose', 'gait.gait:warmup_pose'),
+}
+
+
+def _resolve(path):
+    module_name, function_name = path.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _format_key(key):
+    if len(key) == 1:
+        return key[0]
+    return '{}({})'.format(
+        key[0], ', '.join('{}={}'.format(name, value) for name, value in key[1:]))
+
+
+class ModelRegistry(object):
+    def __init__(self, models=MODELS):
+        self._models = dict(models)
+        self._instances = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None):
+        self._models[name] = (loader, warmup)
+
+    def functions(self, name):
+        # (загрузчик, прогрев) без кэширования: для замеров бэкендов
+        return tuple(
+            _resolve(function) if isinstance(function, str) else function
+            for function in self._models[name])
+
+    def _key(self, name, kwargs):
+        return (name, ) + tuple(sorted(kwargs.items()))
+
+    def get(self, name, **kwargs):
+        # Загрузка один раз на процесс (для каждого набора параметров)
+        key = self._key(name, kwargs)
+        with self._lock:
+            if key not in self._instances:
+                loader = self._models[name][0]
+                if isinstance(loader, str):
+                    loader = _resolve(loader)
+                start = time.perf_counter()
+                self._instances[key] = loader(**kwargs)
+                self._timings.setdefault(key, {})['load'] = (
+                    time.perf_counter() - start)
+            return self._instances[key]
+
+    def warmup(self, name, **kwargs):
+        # Пробный прогон, чтобы первый настоящий кадр не стоял
+        model = self.get(name, **kwargs)
+        warmup = self._models[name][1]
+        if warmup is None:
+            return model
+        if isinstance(warmup, str):
+            warmup = _resolve(warmup)
+        start = time.perf_counter()
+        warmup(model)
+        with self._lock:
+            self._timings[self._key(name, kwargs)]['warmup'] = (
+                time.perf_counter() - start)
+        return model
+
+    def is_loaded(self, name, **kwargs):
+        return self._key(name, kwargs) in self._instances
+
+    def timings(self):
+        with self._lock:
+            return {
+                _format_key(key): dict(value)
+                for key, value in self._timings.items()
+            }
+
+    def report(self):
+        lines = []
+        for name, timing in self.timings().items():
+            lines.append('{}: load {:.3f}s, warmup {}'.format(
+                name, timing['load'],
+                '{:.3f}s'.format(timing['warmup'])
+                if 'warmup' in timing else '-'))
+        return '\n'.join(lines)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import cv2 as cv
+import numpy as np
+
+STAGES = ('detector', 'emotion', 'face_age', 'gait')
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--input", help='video file', type=str, required=True)
+    parser.add_argument("--output",
+                        help='per-frame results (json lines)',
+                        type=str,
+                        default='results.jsonl')
+    parser.add_argument("--stages", nargs='*', choices=STAGES,
+                        default=['gait'])
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--shards",
+                        help='number of frame ranges (default: 2 per worker)',
+                        type=int,
+                        default=None)
+    parser.add_argument("--overlap",
+                        help='warm-up frames before a shard for trackers '
+                        '(default: --feature_window)',
+                        type=int,
+                        default=None)
+    parser.add_argument("--feature_window",
+                        help='gait feature window (frames)',
+                        type=int,
+                        default=128)
+    parser.add_argument("--model_complexity", type=int, default=1)
+
+    args = parser.parse_args()
+    # Окно признаков походки должно заполниться до начала шарда,
+    # иначе первые кадры шарда отличаются от последовательного прогона
+    if args.overlap is None:
+        args.overlap = args.feature_window
+    if ('gait' in args.stages and args.overlap < args.feature_window):
+        parser.error('--overlap must be >= --feature_window for gait')
+
+    return args
+
+
+class DetectorRunner(object):
+    stateful = False
+
+    def __init__(self, options):
+        from detector.detector import ObjectDetector
+
+        self.detector = ObjectDetector()
+
+    def process(self, frame, timestamp):
+        from detector.detector import classNames
+
+        bbox, classIds, confs = self.detector.detect(frame)
+        return {
+            'objects': [{
+                'box': box,
+                'class': classNames[class_id],
+                'confidence': round(conf, 3),
+            } for box, class_id, conf in zip(bbox.tolist(), classIds.tolist(),
+                                             confs.tolist())]
+        }
+
+    def close(self):
+        pass
+
+
+class EmotionRunner(object):
+    stateful = False
+
+    def __init__(self, options):
+        from emotion.videoTester import EmotionClassifier
+        from Face_age.face_detector import FaceDetector
+        from pipeline.models import registry
+
+        self.face_detector = FaceDetector()
+        self.classifier = EmotionClassifier(registry.get('emotion'))
+
+    def process(self, frame, timestamp):
+        from Face_age.face_detector import toRects
+
+        face_boxes = self.face_detector.detect(frame)
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        emotions = self.classifier.predict(gray, toRects(face_boxes))
+        return {
+            'emotions': [{
+                'box': box,
+                'emotion': emotion
+            } for box, emotion in zip(face_boxes.tolist(), emotions)]
+        }
+
+    def close(self):
+        pass
+
+
+class FaceAgeRunner(object):
+    stateful = False
+
+    def __init__(self, options):
+        from Face_age.face_detector import FaceDetector
+        from pipeline.models import registry
+
+        self.face_detector = FaceDetector()
+        self.age_net, self.gender_net = registry.get('age_gender')
+
+    def process(self, frame, timestamp):
+        from Face_age.neyron import predictAgeGender
+
+        results = predictAgeGender(self.age_net, self.gender_net, frame,
+                                   self.face_detector.detect(frame))
+        return {
+            'faces': [{
+                'box': [int(v) for v in result['box']],
+                'gender': result['gender'],
+                'age': result['age'],
+            } for result in results]
+        }
+
+    def close(self):
+        pass
+
+
+class GaitRunner(object):
+    # Pose и окно признаков зависят от предыдущих кадров
+    stateful = True
+
+    def __init__(self, options):
+        from gait.gait import load_pose
+        from gait.features import GaitFeatureEngine
+
+        # Новый экземпляр Pose на шард: трекинг не переносится между шардами
+        self.pose = load_pose(model_complexity=options['model_complexity'])
+        self.feature_engine = GaitFeatureEngine(
+            window=options['feature_window'])
+
+    def process(self, frame, timestamp):
+        from gait.gait import calc_landmark_array, scale_landmark_array
+
+        results = self.pose.process(cv.cvtColor(frame, cv.COLOR_BGR2RGB))
+        if results.pose_landmarks is None:
+            return {'landmarks': None, 'gait': None}
+        landmark_array = scale_landmark_array(
+            calc_landmark_array(results.pose_landmarks), frame.shape[1],
+            frame.shape[0])
+        return {
+            'landmarks': np.round(landmark_array, 3).tolist(),
+            'gait': self.feature_engine.update(landmark_array, timestamp),
+        }
+
+    def close(self):
+        self.pose.close()
+
+
+RUNNERS = {
+    'detector': DetectorRunner,
+    'emotion': EmotionRunner,
+    'face_age': FaceAgeRunner,
+    'gait': GaitRunner,
+}
+
+
+def plan_shards(frame_count, shards, overlap, stateful):
+    # Диапазоны [start, end) и начало прогрева перед каждым
+    bounds = np.linspace(0, frame_count, shards + 1).astype(int).tolist()
+    plan = []
+    for index, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if end <= start:
+            continue
+        if index == shards - 1:
+            # FRAME_COUNT бывает неточным: последний шард читает до конца
+            end = sys.maxsize
+        warm_start = max(start - overlap, 0) if stateful else start
+        plan.append((start, end, warm_start))
+    return plan
+
+
+def run_shard(task):
+    video_path, stages, options, (start, end, warm_start) = task
+    runners = [RUNNERS[stage](options) for stage in stages]
+
+    cap = cv.VideoCapture(video_path)
+    fps = cap.get(cv.CAP_PROP_FPS) or 30.0
+    if warm_start > 0:
+        # Бэкенд встает на ближайший ключевой кадр; позицию берем у него
+        cap.set(cv.CAP_PROP_POS_FRAMES, warm_start)
+    frame_index = int(cap.get(cv.CAP_PROP_POS_FRAMES))
+    while frame_index < warm_start and cap.grab():
+        frame_index += 1
+
+    results = []
+    while frame_index < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        # Время по номеру кадра: одинаково в любом шарде
+        timestamp = frame_index / fps
+        result = {'frame': frame_index, 'time': round(timestamp, 4)}
+        for runner in runners:
+            result.update(runner.process(frame, timestamp))
+        # Кадры прогрева только прогоняют трекеры, в выход не попадают
+        if frame_index >= start:
+            results.append(result)
+        frame_index += 1
+
+    cap.release()
+    for runner in runners:
+        runner.close()
+    return results
+
+
+def main():
+    args = get_args()
+
+    cap = cv.VideoCapture(args.input)
+    frame_count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    workers = max(args.workers, 1)
+    shards = args.shards or workers * 2
+    stateful = any(RUNNERS[stage].stateful for stage in args.stages)
+    options = {
+        'model_complexity': args.model_complexity,
+        'feature_window': args.feature_window,
+    }
+    tasks = [(args.input, args.stages, options, shard)
+             for shard in plan_shards(max(frame_count, 1), shards,
+                                      args.overlap, stateful)]
+
+    start_time = time.perf_counter()
+    frames = 0
+    with open(args.output, 'w') as f:
+        if workers == 1:
+            shard_results = map(run_shard, tasks)
+        else:
+            # spawn: у каждого процесса свои модели, без общих потоков
+            pool = multiprocessing.get_context('spawn').Pool(workers)
+            shard_results = pool.imap(run_shard, tasks)
+        # imap отдает шарды по порядку: кадры пишутся последовательно
+        for results in shard_results:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+            frames += len(results)
+        if workers > 1:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start_time
+    print('{} frames, {} shards, {} workers: {:.1f}s ({:.1f} fps)'.format(
+        frames, len(tasks), workers, elapsed, frames / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
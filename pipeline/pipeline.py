@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time
+import argparse
+import cv2 as cv
+import numpy as np
+
+from gait.utils import CvFpsCalc, FrameBusReader, ResultCache, frame_valid
+from gait.gait import calc_landmark_array, scale_landmark_array, draw_landmarks
+from gait.features import GaitFeatureEngine
+from gait.multi_pose import box_iou
+from detector.detector import ObjectDetector
+from Face_age.neyron import predictAgeGender
+from pipeline.models import registry
+from pipeline import backends
+from pipeline.results_server import serve
+from Face_age.face_detector import FaceDetector
+
+STAGES = ('gait', 'emotion', 'face_age')
+# Одиночный режим: при IoU с прошлой рамкой ниже порога считаем, что в
+# кадре другой человек. Для нескольких людей в кадре нужен --multi_person
+GAIT_SWITCH_IOU = 0.3
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--width", help='cap width', type=int, default=640)
+    parser.add_argument("--height", help='cap height', type=int, default=360)
+    parser.add_argument("--frame_bus",
+                        help='read frames from pipeline.camera (shared memory)',
+                        type=str,
+                        default=None)
+
+    parser.add_argument("--stages",
+                        help='enabled stages after the person detector',
+                        nargs='*',
+                        choices=STAGES,
+                        default=list(STAGES))
+    parser.add_argument("--person_threshold", type=float, default=0.5)
+    parser.add_argument("--model_complexity",
+                        help='model_complexity(0,1(default),2)',
+                        type=int,
+                        default=1)
+    parser.add_argument('--multi_person',
+                        help='pose for every person, not only the most confident',
+                        action='store_true')
+    parser.add_argument("--pose_workers",
+                        help='Pose worker processes (0: in-process)',
+                        type=int,
+                        default=2)
+    parser.add_argument("--face_threshold", type=float, default=0.7)
+    parser.add_argument("--face_region",
+                        help='top fraction of a person box searched for faces',
+                        type=float,
+                        default=0.5)
+    parser.add_argument("--dnn_backend",
+                        help='cv.dnn backend for all nets, auto: benchmark',
+                        choices=list(backends.BACKENDS) + ['auto'],
+                        default=None)
+    parser.add_argument('--warmup',
+                        help='run a dummy inference per model at startup',
+                        action='store_true')
+    parser.add_argument('--result_cache',
+                        help='reuse emotion/age results for unchanged faces',
+                        action='store_true')
+    parser.add_argument('--results_port',
+                        help='publish per-frame results as json lines (tcp)',
+                        type=int,
+                        default=None)
+    parser.add_argument('--results_socket',
+                        help='same over a unix socket',
+                        type=str,
+                        default=None)
+
+    args = parser.parse_args()
+
+    return args
+
+
+class PersonPipeline(object):
+    def __init__(
+            self,
+            stages=STAGES,
+            person_threshold=0.5,
+            model_complexity=1,
+            face_threshold=0.7,
+            face_region=0.5,
+            multi_person=False,
+            pose_workers=2,
+            result_cache=False,
+    ):
+        self.stages = tuple(stages)
+        self.face_region = face_region
+        # Модели, которые использует конвейер: (имя, параметры) в реестре
+        self.models = [('yolo', {})]
+
+        # Детектор людей запускается один раз на кадр
+        self.detector = ObjectDetector(
+            classes=['person'],
+            classThresholds={'person': person_threshold})
+
+        # Модели этапов загружаются только если этап включен
+        self.pose = None
+        self.multi_pose = None
+        if 'gait' in self.stages and multi_person:
+            # Pose для каждого человека в пуле процессов, со своим треком
+            from gait.multi_pose import MultiPersonPose
+
+            self.multi_pose = MultiPersonPose(
+                workers=pose_workers, model_complexity=model_complexity)
+        elif 'gait' in self.stages:
+            self.pose = registry.get('pose',
+                                     model_complexity=model_complexity)
+            self.models.append(('pose', {
+                'model_complexity': model_complexity
+            }))
+            self.feature_engine = GaitFeatureEngine()
+            self.gait_box = None
+
+        # Один детектор лиц на оба классификатора
+        self.face_detector = None
+        if 'emotion' in self.stages or 'face_age' in self.stages:
+            self.face_detector = FaceDetector(confThreshold=face_threshold)
+            self.models.append(('face_ssd', {}))
+
+        self.emotion_model = None
+        if 'emotion' in self.stages:
+            # keras импортируется только при включенном этапе emotion
+            from emotion.videoTester import EmotionClassifier
+
+            self.emotion_model = EmotionClassifier(
+                registry.get('emotion'),
+                cache=ResultCache() if result_cache else None)
+            self.models.append(('emotion', {}))
+
+        self.age_net = self.gender_net = None
+        if 'face_age' in self.stages:
+            self.age_net, self.gender_net = registry.get('age_gender')
+            self.models.append(('age_gender', {}))
+        # Кэш результатов по лицам: неизменившиеся лица не идут в сети
+        self.age_cache = ResultCache() if result_cache else None
+
+    def warmup(self):
+        for name, kwargs in self.models:
+            registry.warmup(name, **kwargs)
+
+    def close(self):
+        if self.multi_pose is not None:
+            self.multi_pose.close()
+
+    def process(self, image):
+        image_height, image_width = image.shape[:2]
+
+        bbox, _, confs = self.detector.detect(image)
+        persons = []
+        for (x, y, w, h), conf in zip(bbox.tolist(), confs.tolist()):
+            x1, y1 = max(x, 0), max(y, 0)
+            x2, y2 = min(x + w, image_width), min(y + h, image_height)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            persons.append({
+                'box': (x1, y1, x2, y2),
+                'confidence': conf,
+                'track_id': None,
+                'landmarks': None,
+                'gait': None,
+                'faces': [],
+            })
+
+        # Pose отслеживает одного человека: берем самого уверенного
+        if self.pose is not None and persons:
+            self._process_gait(image,
+                               max(persons, key=lambda p: p['confidence']))
+        if self.multi_pose is not None:
+            persons.sort(key=lambda p: -p['confidence'])
+            for person, result in zip(
+                    persons,
+                    self.multi_pose.process(image,
+                                            [p['box'] for p in persons],
+                                            time.perf_counter())):
+                person['track_id'] = result['track_id']
+                person['landmarks'] = result['landmarks']
+                person['gait'] = result['gait']
+
+        if self.face_detector is not None:
+            for person in persons:
+                self._process_faces(image, person)
+
+            faces = [face for person in persons for face in person['faces']]
+
+            # Все лица кадра - одним вызовом predict
+            if self.emotion_model is not None and faces:
+                gray_image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+                face_rects = [(x1, y1, x2 - x1, y2 - y1)
+                              for x1, y1, x2, y2 in (f['box'] for f in faces)]
+                for face, emotion in zip(
+                        faces,
+                        self.emotion_model.predict(gray_image, face_rects)):
+                    face['emotion'] = emotion
+
+            # Возраст и пол - один батч на кадр
+            if self.age_net is not None:
+                for face, result in zip(
+                        faces,
+                        predictAgeGender(self.age_net, self.gender_net, image,
+                                         [face['box'] for face in faces],
+                                         self.age_cache)):
+                    face['gender'], face['age'] = result['gender'], result[
+                        'age']
+
+        return persons
+
+    def _process_gait(self, image, person):
+        x1, y1, x2, y2 = person['box']
+        # Самым уверенным стал другой человек: окно признаков начинается
+        # заново, чтобы не смешивать походку разных людей
+        if (self.gait_box is not None
+                and box_iou(self.gait_box, person['box']) < GAIT_SWITCH_IOU):
+            self.feature_engine.reset()
+        self.gait_box = person['box']
+        crop = cv.cvtColor(image[y1:y2, x1:x2], cv.COLOR_BGR2RGB)
+        results = self.pose.process(crop)
+        if results.pose_landmarks is None:
+            return
+
+        # Координаты кропа -> координаты всего кадра
+        landmark_array = scale_landmark_array(
+            calc_landmark_array(results.pose_landmarks), x2 - x1, y2 - y1)
+        landmark_array[:, :2] += (x1, y1)
+        person['landmarks'] = landmark_array
+        person['gait'] = self.feature_engine.update(landmark_array,
+                                                    time.perf_counter())
+
+    def _process_faces(self, image, person):
+        # Лица ищем только в верхней части прямоугольника человека
+        x1, y1, x2, y2 = person['box']
+        region_y2 = y1 + max(int((y2 - y1) * self.face_region), 1)
+        face_boxes = self.face_detector.detect(image[y1:region_y2, x1:x2])
+
+        person['faces'].extend(
+            {'box': tuple(face_box)}
+            for face_box in (face_boxes + (x1, y1, x1, y1)).tolist())
+
+
+def draw_results(image, persons):
+    for person in persons:
+        x1, y1, x2, y2 = person['box']
+        cv.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = 'PERSON ' + str(int(person['confidence'] * 100)) + '%'
+        if person['track_id'] is not None:
+            label += ' ID:' + str(person['track_id'])
+        cv.putText(image, label, (x1, y1 - 10), cv.FONT_HERSHEY_SIMPLEX, 0.6,
+                   (0, 255, 0), 2)
+
+        if person['landmarks'] is not None:
+            image = draw_landmarks(image, person['landmarks'])
+
+        for face in person['faces']:
+            fx1, fy1, fx2, fy2 = face['box']
+            cv.rectangle(image, (fx1, fy1), (fx2, fy2), (255, 0, 0), 2)
+            labels = [
+                face[key] for key in ('emotion', 'gender', 'age')
+                if key in face
+            ]
+            cv.putText(image, ', '.join(labels), (fx1, fy2 + 20),
+                       cv.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2,
+                       cv.LINE_AA)
+
+    return image
+
+
+def main():
+    args = get_args()
+    backends.setup(['yolo', 'face_ssd', 'age_gender'], args.dnn_backend)
+
+    # Одна камера на весь конвейер
+    if args.frame_bus is not None:
+        cap = FrameBusReader(args.frame_bus)
+    else:
+        cap = cv.VideoCapture(args.device)
+        cap.set(cv.CAP_PROP_FRAME_WIDTH, args.width)
+        cap.set(cv.CAP_PROP_FRAME_HEIGHT, args.height)
+
+    pipeline = PersonPipeline(
+        stages=args.stages,
+        person_threshold=args.person_threshold,
+        model_complexity=args.model_complexity,
+        face_threshold=args.face_threshold,
+        face_region=args.face_region,
+        multi_person=args.multi_person,
+        pose_workers=args.pose_workers,
+        result_cache=args.result_cache,
+    )
+    if args.warmup:
+        pipeline.warmup()
+    print(registry.report())
+
+    cvFpsCalc = CvFpsCalc(buffer_len=10)
+    results_server = serve(args.results_port, args.results_socket)
+    frame_index = 0
+
+    while True:
+        display_fps = cvFpsCalc.get()
+
+        ret, image = cap.read()
+        if not ret:
+            break
+
+        persons = pipeline.process(image)
+        if not frame_valid(cap):
+            # Кадр из общей памяти перезаписан во время обработки
+            continue
+        if results_server is not None:
+            results_server.publish('pipeline', frame_index, persons=persons)
+        frame_index += 1
+
+        debug_image = draw_results(np.copy(image), persons)
+        cv.putText(debug_image, "FPS:" + str(display_fps), (10, 30),
+                   cv.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2, cv.LINE_AA)
+
+        key = cv.waitKey(1)
+        if key == 27:  # ESC
+            break
+
+        cv.imshow('Pipeline', debug_image)
+
+    if results_server is not None:
+        results_server.stop()
+    pipeline.close()
+    cap.release()
+    cv.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    main()
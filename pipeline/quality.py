@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+
+
+class QualityController(object):
+    # Лестница уровней качества: levels[0] - лучшее качество.
+    # Средняя задержка за окно выше бюджета -> уровень вниз,
+    # ниже upgrade_ratio * бюджет -> уровень вверх. После каждой смены
+    # окно набирается заново, поэтому уровни не скачут каждый кадр.
+    def __init__(self, levels, budget, window=30, upgrade_ratio=0.6,
+                 apply=None):
+        self.levels = list(levels)
+        self.budget = budget
+        self.upgrade_ratio = upgrade_ratio
+        self.apply = apply
+        self.level = 0
+        self._latencies = deque(maxlen=window)
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def update(self, latency):
+        # latency в секундах; возвращает новые настройки, если уровень сменился
+        self._latencies.append(latency)
+        if len(self._latencies) < self._latencies.maxlen:
+            return None
+
+        mean = sum(self._latencies) / len(self._latencies)
+        if mean > self.budget and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif (mean < self.budget * self.upgrade_ratio and self.level > 0):
+            self.level -= 1
+        else:
+            return None
+
+        self._latencies.clear()
+        if self.apply is not None:
+            self.apply(self.settings)
+        return self.settings
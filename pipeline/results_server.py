@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import asyncio
+import threading
+import numpy as np
+
+
+def _default(value):
+    # numpy в JSON: массивы списками, скаляры числами
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(repr(value) + ' is not JSON serializable')
+
+
+def encode(message):
+    return (json.dumps(message, default=_default, separators=(',', ':')) +
+            '\n').encode('utf-8')
+
+
+class ResultsServer(object):
+    # Локальный сервер результатов: JSON lines по TCP или Unix-сокету.
+    # Цикл asyncio работает в своем потоке; publish() из цикла обработки
+    # только передает сообщение в него и никогда не ждет клиентов.
+    # У каждого подписчика своя ограниченная очередь: при переполнении
+    # выбрасывается самое старое сообщение.
+    def __init__(self, host='127.0.0.1', port=None, path=None, queue_size=64):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._queues = set()
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._error = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            # Порт занят или путь сокета недоступен: ошибка в вызывающий поток
+            self._thread.join()
+            raise self._error
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        if self.path is not None:
+            server = asyncio.start_unix_server(self._handle, path=self.path)
+        else:
+            server = asyncio.start_server(self._handle, self.host, self.port)
+        try:
+            self._server = self._loop.run_until_complete(server)
+            if self.path is None:
+                # port=0: порт выбирает система
+                self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as error:
+            self._error = error
+            self._loop.close()
+            return
+        finally:
+            self._started.set()
+        self._loop.run_forever()
+
+        # Остановка: закрыть сокет и отменить задачи подписчиков
+        self._server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    async def _handle(self, reader, writer):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.add(queue)
+        try:
+            while True:
+                data = await queue.get()
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._queues.discard(queue)
+            writer.close()
+
+    def _broadcast(self, message):
+        data = encode(message)
+        for queue in self._queues:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(data)
+
+    def publish(self, source, frame, **payload):
+        message = {'source': source, 'frame': frame, 'time': time.time()}
+        message.update(payload)
+        self._loop.call_soon_threadsafe(self._broadcast, message)
+
+    @property
+    def subscribers(self):
+        return len(self._queues)
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1.0)
+
+
+def serve(port=None, path=None, queue_size=64):
+    # None, если сервер не запрошен ни портом, ни путем сокета
+    if port is None and path is None:
+        return None
+    return ResultsServer(port=port, path=path, queue_size=queue_size).start()
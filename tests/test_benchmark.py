@@ -0,0 +1,33 @@
+import numpy as np
+
+from pipeline import benchmark
+
+
+class StubStage(object):
+    models = []
+
+    def run(self, frame, timer):
+        with timer.phase('forward'):
+            frame.sum()
+
+
+def test_run_stage_stops_at_end_of_input(monkeypatch):
+    monkeypatch.setitem(benchmark.STAGE_CLASSES, 'stub', StubStage)
+    frames = [np.zeros((4, 4, 3), np.uint8) for _ in range(5)]
+
+    result = benchmark.run_stage('stub', frames, 5, 0)
+
+    assert result['frames'] == 5
+    assert result['phases']['capture']['n'] == 5
+    assert result['phases']['forward']['n'] == 5
+    assert result['total']['n'] == 5
+
+
+def test_run_stage_skips_warmup_frames(monkeypatch):
+    monkeypatch.setitem(benchmark.STAGE_CLASSES, 'stub', StubStage)
+    frames = (np.zeros((4, 4, 3), np.uint8) for _ in range(8))
+
+    result = benchmark.run_stage('stub', frames, 8, 3)
+
+    assert result['frames'] == 8
+    assert result['phases']['forward']['n'] == 5
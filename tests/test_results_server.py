@@ -0,0 +1,40 @@
+import json
+import time
+import socket
+
+import pytest
+
+from pipeline.results_server import serve
+
+
+def test_busy_port_raises():
+    server = serve(port=0)
+    try:
+        with pytest.raises(OSError):
+            serve(port=server.port)
+    finally:
+        server.stop()
+
+
+def test_bad_socket_path_raises(tmp_path):
+    with pytest.raises(OSError):
+        serve(path=str(tmp_path / 'missing' / 'results.sock'))
+
+
+def test_publish_reaches_subscriber():
+    server = serve(port=0)
+    try:
+        client = socket.create_connection(('127.0.0.1', server.port),
+                                          timeout=2.0)
+        # Подписчик регистрируется в потоке сервера асинхронно
+        deadline = time.monotonic() + 2.0
+        while not server.subscribers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        server.publish('test', 7, value=1)
+        message = json.loads(client.makefile('r').readline())
+        assert message['source'] == 'test'
+        assert message['frame'] == 7
+        assert message['value'] == 1
+        client.close()
+    finally:
+        server.stop()
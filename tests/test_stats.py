@@ -0,0 +1,46 @@
+import time
+import threading
+
+from gait.utils import Metrics
+
+
+def test_nested_timer_keeps_outer_start():
+    metrics = Metrics()
+    timer = metrics.timer('stage')
+
+    with timer:
+        time.sleep(0.05)
+        with timer:
+            pass
+
+    histogram = metrics.histogram('stage')
+    assert histogram.count == 2
+    assert histogram.max >= 0.05
+
+
+def test_timer_threads_do_not_share_start():
+    metrics = Metrics()
+    timer = metrics.timer('stage')
+    entered = threading.Barrier(2)
+
+    def slow():
+        with timer:
+            entered.wait()
+            time.sleep(0.05)
+
+    def fast():
+        entered.wait()
+        time.sleep(0.03)
+        with timer:
+            pass
+
+    threads = [threading.Thread(target=slow), threading.Thread(target=fast)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    histogram = metrics.histogram('stage')
+    assert histogram.count == 2
+    assert histogram.max >= 0.05
+    assert histogram.total - histogram.max < 0.05